@@ -1,128 +1,239 @@
-from flask import Flask, render_template, request, redirect, url_for, abort
+from flask import Flask, render_template, request, redirect, url_for, abort, g
+from werkzeug.local import LocalProxy
+from flask import before_render_template, template_rendered
 from pathlib import Path
 from flask import jsonify
-import json
 from flask import Response
-import csv
-import io
-import shutil
-from datetime import datetime
+import atexit
+import functools
+import hashlib
+import time
+from datetime import datetime, timezone
+from store import decode_cursor, append_ops, move_ops, toggle_ops, task_etag
+from exports import EXPORT_FORMATS, iter_export, iter_gzip
+from imports import detect_format, read_import
+from batch import build_batch
+from storage import update_data, read_bytes, decode, set_format, iter_list, FORMATS
+from storage import PreconditionFailed, content_etag, check_etag, file_signature
+from metrics import METRICS
+from render import compile_salon, salon_key, render_plan, render_contenu
+from config import CONFIG_FILE, load_config, STORAGE_BACKENDS
+from backups import diff_snapshot
+from kpi import GRAINS
+from tenants import Tenant, TenantRouter, SharedFile, open_tenants
 
 app = Flask(__name__)
 
-DATA_FILE = Path("tasks.json")
+# format d'écriture des fichiers de données (json / compact / binary) ; la lecture le reconnaît seule
+set_format(load_config().get("data_format", "json"))
 
-BACKUP_DIR = Path("backups")
-CONFIG_FILE = Path("config.json")
 
-TODAY_FILE = Path("today.json")
+# instrumentation : durée par route, spans (stockage, backups, rendu) -> /metrics ;
+# avec slow_request_ms > 0, les requêtes plus lentes sont journalisées avec leurs spans
+SLOW_REQUEST_MS = int(load_config().get("slow_request_ms", 0))
 
 
-DEFAULT_CONFIG = {
-    "keep_backups": 30,
-    "port": 5001,
-}
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    METRICS.start_request()
 
 
-def load_tasks():
-    if not DATA_FILE.exists():
-        return []
-    return json.loads(DATA_FILE.read_text(encoding="utf-8"))
+@app.after_request
+def record_request(response):
+    elapsed = time.perf_counter() - g.started
+    route = request.endpoint or "inconnue"
+    METRICS.observe("request_duration_seconds", elapsed, route=route, method=request.method)
+    METRICS.inc("requests_total", route=route, method=request.method, status=response.status_code)
+    spans = METRICS.end_request()
+    if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+        detail = ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in spans)
+        print(f"🐢 {request.method} {request.full_path.rstrip('?')} {elapsed * 1000:.1f} ms [{detail}]")
+    return response
 
 
-def load_config():
-    if not CONFIG_FILE.exists():
-        return DEFAULT_CONFIG.copy()
-    try:
-        data = json.loads(CONFIG_FILE.read_text(encoding="utf-8"))
-        cfg = DEFAULT_CONFIG.copy()
-        cfg.update({k: data[k] for k in DEFAULT_CONFIG.keys() if k in data})
-        return cfg
-    except Exception:
-        return DEFAULT_CONFIG.copy()
-    
+def template_started(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
 
-def save_config(cfg):
-    CONFIG_FILE.write_text(json.dumps(cfg, ensure_ascii=False, indent=2), encoding="utf-8")
 
+def template_finished(sender, template, context, **extra):
+    started = g.pop("template_started", None)
+    if started is not None:
+        METRICS.record_span(f"template.{template.name}", time.perf_counter() - started)
 
-def prune_backups(keep=30):
-    if not BACKUP_DIR.exists():
-        return
-    files = sorted(BACKUP_DIR.glob("tasks-*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
-    for f in files[keep:]:
-        f.unlink()
 
+before_render_template.connect(template_started, app)
+template_rendered.connect(template_finished, app)
+
+# multi-salons (config.json "tenant_mode") : "prefix" = /t/<nom>/..., "subdomain" =
+# <nom>.domaine ; chaque salon a son dossier dans tenants_dir (voir tenants.py).
+# Par défaut un seul salon : les fichiers du dossier courant.
+TENANT_MODE = load_config().get("tenant_mode", "")
+
+# routes communes à tous les salons (réglages et métriques du processus)
+GLOBAL_ENDPOINTS = {"settings", "settings_save", "metrics", "static"}
+
+if TENANT_MODE:
+    TENANTS = open_tenants(load_config())
+    SINGLE = None
+    app.wsgi_app = TenantRouter(app.wsgi_app, TENANT_MODE)
+    atexit.register(TENANTS.close_all)
+else:
+    TENANTS = None
+    SINGLE = Tenant("", ".", load_config())
+    atexit.register(SINGLE.close)
+
+
+@app.before_request
+def open_tenant():
+    # salon inconnu : 404 (les salons se créent avec `python tenants.py create <nom>`)
+    if TENANT_MODE:
+        name = request.environ.get("taches.tenant")
+        g.tenant = TENANTS.acquire(name) if name else None
+        if g.tenant is None and request.endpoint not in GLOBAL_ENDPOINTS:
+            abort(404)
+
+
+@app.teardown_request
+def release_tenant(exc):
+    tenant = g.pop("tenant", None)
+    if tenant is not None:
+        TENANTS.release(tenant)
+
+
+def keep_tenant(resp):
+    # réponse en flux : le salon reste utilisé jusqu'à la fin de l'envoi
+    # (libéré à la fermeture de la réponse, plus par release_tenant)
+    tenant = g.pop("tenant", None)
+    if tenant is not None:
+        resp.call_on_close(lambda: TENANTS.release(tenant))
+    return resp
+
+
+def current_tenant():
+    if not TENANT_MODE:
+        return SINGLE
+    tenant = g.get("tenant")
+    if tenant is None:
+        abort(404)
+    return tenant
 
-def backup_tasks_file():
-    if DATA_FILE.exists():
-        BACKUP_DIR.mkdir(exist_ok=True)
-        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
-        shutil.copy2(DATA_FILE, BACKUP_DIR / f"tasks-{stamp}.json")
-        cfg = load_config()
-        prune_backups(int(cfg.get("keep_backups", 30)))
+
+def all_tenants():
+    return TENANTS.open_tenants() if TENANT_MODE else [SINGLE]
+
+
+# stores du salon de la requête (tâches, programme, backups, caches de rendu)
+TASKS = LocalProxy(lambda: current_tenant().tasks)
+PLAN = LocalProxy(lambda: current_tenant().plan)
+BACKUPS = LocalProxy(lambda: current_tenant().backups)
+BACKUP_WORKER = LocalProxy(lambda: current_tenant().backup_worker)
+RENDERS = LocalProxy(lambda: current_tenant().renders)
+# historique des indicateurs de /suivi (journal + cumuls, voir kpi.py)
+KPI = LocalProxy(lambda: current_tenant().kpi)
+# pages en lecture seule : ETag calculé depuis les versions des fichiers
+# sources, 304 avant de charger ou rendre quoi que ce soit, HTML gardé par ETag
+PAGES = LocalProxy(lambda: current_tenant().pages)
+
+# contenu.json : modèle commun en lecture seule, décodé une fois pour tous les salons
+CONTENU_FILE = Path("contenu.json")
+CONTENU = SharedFile(CONTENU_FILE)
+
+TODAY_FILE = Path("today.json")
+
+
+def load_tasks():
+    return TASKS.load()
+
+
+PAGE_SIZE = int(load_config().get("page_size", 50))
 
 
 def save_tasks(tasks):
-    backup_tasks_file()
-    DATA_FILE.write_text(json.dumps(tasks, ensure_ascii=False, indent=2), encoding="utf-8")
+    TASKS.save(tasks)
 
 
-def ordered_items(tasks):
-    return sorted(
-        list(enumerate(tasks)),
-        key=lambda it: (it[1].get("done", False), it[1].get("pos", 10**9)),
-    )
+def file_source(path):
+    sig = file_signature(path)
+    return sig, (sig[0] / 1e9 if sig else None)
+
+
+def conditional(*sources, stream=False):
+    def wrap(view):
+        @functools.wraps(view)
+        def inner(*args, **kwargs):
+            versions = [source() for source in sources]
+            gzip = stream and "gzip" in request.headers.get("Accept-Encoding", "")
+            etag = hashlib.sha1(repr((current_tenant().name, request.full_path, gzip, [v for v, _ in versions])).encode("utf-8")).hexdigest()[:20]
+            mtimes = [m for _, m in versions if m is not None]
+            last_modified = datetime.fromtimestamp(int(max(mtimes)), timezone.utc) if mtimes else None
+
+            if request.if_none_match:
+                fresh = request.if_none_match.contains(etag)
+            else:
+                fresh = bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+
+            if fresh:
+                resp = Response(status=304)
+            elif stream:
+                resp = app.make_response(view(*args, **kwargs))
+            else:
+                resp = app.make_response(PAGES.get(etag, lambda: view(*args, **kwargs)))
+            resp.set_etag(etag)
+            if last_modified:
+                resp.last_modified = last_modified
+            resp.headers["Cache-Control"] = "no-cache"
+            return resp
+        return inner
+    return wrap
+
+
+def tasks_source():
+    return TASKS.version(), TASKS.mtime()
+
+
+def plan_source():
+    # signature du fichier seule : identique d'un processus à l'autre et après
+    # redémarrage ; nos propres écritures la changent aussi
+    return file_source(current_tenant().plan_file)
+
 
 @app.get("/")
 def index():
     q = (request.args.get("q") or "").strip().lower()
     
-    tasks = load_tasks()
-    items = ordered_items(tasks)
-    
-    total = len(tasks)
-    done = sum(1 for t in tasks if t.get("done"))
+    total, done = TASKS.counts()
     todo = total - done
 
-    filtered_items = items
+    page = TASKS.page(
+        PAGE_SIZE,
+        after=decode_cursor(request.args.get("after")),
+        before=decode_cursor(request.args.get("before")),
+        q=q,
+    )
     if q:
-       filtered_items = [(i, t) for (i, t) in items if q in (t.get("title", "").lower())] 
-    
-    filtered_total = len(filtered_items)
-    filtered_done = sum(1 for _, t in filtered_items if t.get("done"))
+        # numéros affichés = rang dans la liste complète
+        rows = [(TASKS.rank(key, t), t) for key, t in page["items"]]
+    else:
+        rows = [(page["start"] + n, t) for n, (_, t) in enumerate(page["items"], start=1)]
+
+    filtered_total = page["total"]
+    filtered_done = page["done"]
     filtered_todo = filtered_total - filtered_done
     
     plan_progress = {"done": 0, "total": 0, "pct": 0}
-    try:
-        plan = load_plan()
-        total_actions = 0
-        done_actions = 0
-        for d in plan.get("days", []):
-            for it in d.get("items", []):
-                total_actions += 1
-                if it.get("done"):
-                    done_actions += 1
-        pct = int((done_actions / total_actions) * 100) if total_actions else 0
-        plan_progress = {"done": done_actions, "total": total_actions, "pct": pct}
-    except Exception:
-        pass
-
-
     current_day = None
     try:
-        plan = load_plan()
-        for d in plan.get("days", []):
-            items = d.get("items", [])
-            if items and any(not it.get("done") for it in items):
-                current_day = d.get("day")
-                break
+        plan = PLAN.load()
+        plan_progress = plan.progress()
+        current_day = plan.current_day()
     except Exception:
         pass
 
     return render_template(
         "index.html",
-        items=filtered_items, 
+        items=rows,
+        page=page,
         q=q,
         total=total, done=done, todo=todo,
         filtered_total=filtered_total, filtered_done=filtered_done, filtered_todo=filtered_todo, plan_progress=plan_progress, current_day=current_day)
@@ -132,228 +243,289 @@ def index():
 def add():
     title = request.form.get("title", "").strip()
     if title:
-        tasks = load_tasks()
-        max_pos = max((t.get("pos", 0) for t in tasks), default=0)
-        tasks.append({"title": title, "done": False, "pos": max_pos + 10})
-        save_tasks(tasks)
+        TASKS.apply_batch(lambda store: (append_ops(store, [{"title": title, "done": False}]), None))
     return redirect(url_for("index"))
 
-@app.post("/toggle/<int:display_id>")
-def toggle(display_id):
-    tasks = load_tasks()
-    items = ordered_items(tasks)
-    if 1 <= display_id <= len(items):
-        real_i, _ = items[display_id - 1]
-        tasks[real_i]["done"] = not bool(tasks[real_i].get("done"))
-        save_tasks(tasks)
+@app.post("/toggle/<int:task_id>")
+def toggle(task_id):
+    TASKS.apply_batch(lambda store: (toggle_ops(store, task_id), None))
     return redirect(url_for("index"))
 
 
-@app.post("/delete/<int:display_id>")
-def delete(display_id):
-    tasks = load_tasks()
-    items = ordered_items(tasks)
-    if 1 <= display_id <= len(items):
-        real_i, _ = items[display_id - 1]
-        tasks.pop(real_i)
-        save_tasks(tasks)
+@app.post("/delete/<int:task_id>")
+def delete(task_id):
+    if TASKS.get(task_id):
+        TASKS.apply([{"op": "delete", "id": task_id}])
     return redirect(url_for("index"))
 
 
-@app.post("/edit/<int:display_id>")
-def edit(display_id):
+@app.post("/edit/<int:task_id>")
+def edit(task_id):
     new_title = request.form.get("title", "").strip()
-    tasks = load_tasks()
-    items = ordered_items(tasks)
-    if new_title and 1 <= display_id <= len(items):
-        real_i, _ = items[display_id - 1]
-        tasks[real_i]["title"] = new_title
-        save_tasks(tasks)
+    if new_title and TASKS.get(task_id):
+        TASKS.apply([{"op": "edit", "id": task_id, "title": new_title}])
     return redirect(url_for("index"))
 
-@app.post("/up/<int:display_id>")
-def move_up(display_id):
-    tasks = load_tasks()
-    items = ordered_items(tasks)
-    todo = [(real_i, t) for (real_i, t) in items if not t.get("done", False)]
 
-    if 1 <= display_id <= len(items):
-        real_i, t = items[display_id - 1]
-        if t.get("done", False):
-            return redirect(url_for("index"))
+def swap_with_neighbour(task_id, step):
+    t = TASKS.get(task_id)
+    if t is None or t.get("done", False):
+        return
+
+    other = TASKS.neighbour(task_id, step)
+    if other is None:
+        return
 
-        pos_in_todo = next((k for k, (ri, _) in enumerate(todo) if ri == real_i), None)
-        if pos_in_todo is None or pos_in_todo == 0:
-            return redirect(url_for("index"))
+    other_id, other_t = other
+    TASKS.apply([
+        {"op": "move", "id": task_id, "pos": other_t.get("pos")},
+        {"op": "move", "id": other_id, "pos": t.get("pos")},
+    ])
+
+
+@app.post("/move/<int:task_id>")
+def move(task_id):
+    # glisser-déposer : place la tâche juste avant `before` (vide = à la fin)
+    before = request.form.get("before", "")
+    ops = move_ops(TASKS, task_id, int(before) if before.isdigit() else None)
+    if ops:
+        TASKS.apply(ops)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"moved": len(ops)})
+    return redirect(url_for("index"))
 
-        prev_real_i, _ = todo[pos_in_todo - 1]
-        tasks[real_i]["pos"], tasks[prev_real_i]["pos"] = tasks[prev_real_i]["pos"], tasks[real_i]["pos"]
-        save_tasks(tasks)
 
+@app.post("/up/<int:task_id>")
+def move_up(task_id):
+    swap_with_neighbour(task_id, -1)
     return redirect(url_for("index"))
 
 
-@app.post("/down/<int:display_id>")
-def move_down(display_id):
-    tasks = load_tasks()
-    items = ordered_items(tasks)
+@app.post("/down/<int:task_id>")
+def move_down(task_id):
+    swap_with_neighbour(task_id, 1)
+    return redirect(url_for("index"))
 
-    todo = [(real_i, t) for (real_i, t) in items if not t.get("done", False)]
 
-    if 1 <= display_id <= len(items):
-        real_i, t = items[display_id - 1]
-        if t.get("done", False):
-            return redirect(url_for("index"))
 
-        pos_in_todo = next((k for k, (ri, _) in enumerate(todo) if ri == real_i), None)
-        if pos_in_todo is None or pos_in_todo == len(todo) - 1:
-            return redirect(url_for("index"))
+@app.get("/export.<fmt>")
+@conditional(tasks_source, stream=True)
+def export_tasks(fmt):
+    # /export.csv, /export.ndjson, /export.json ; filtres ?done=0|1 et ?q=
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
 
-        next_real_i, _ = todo[pos_in_todo + 1]
-        tasks[real_i]["pos"], tasks[next_real_i]["pos"] = tasks[next_real_i]["pos"], tasks[real_i]["pos"]
-        save_tasks(tasks)
+    q = (request.args.get("q") or "").strip().lower()
+    done_raw = request.args.get("done")
+    done = None if done_raw not in ("0", "1") else done_raw == "1"
+
+    chunks = iter_export(fmt, TASKS.iter_items(q=q or None, done=done))
+    headers = {"Content-Disposition": f"attachment; filename=tasks.{fmt}", "Vary": "Accept-Encoding"}
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        chunks = iter_gzip(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return keep_tenant(Response(chunks, mimetype=EXPORT_FORMATS[fmt], headers=headers))
+
+
+@app.post("/batch")
+def batch():
+    # JSON : {"ops": [{"op": "toggle", "id": 3}, {"op": "delete", "id": 7}, ...]}
+    # formulaire : action=toggle|delete + ids=... (sélection multiple du tableau de bord)
+    if request.is_json:
+        body = request.get_json(silent=True) or {}
+        ops = body.get("ops") if isinstance(body, dict) else None
+        if not isinstance(ops, list):
+            abort(400)
+    else:
+        action = request.form.get("action", "")
+        ids = [int(x) for x in request.form.getlist("ids") if x.isdigit()]
+        ops = [{"op": action, "id": task_id} for task_id in ids]
 
-    return redirect(url_for("index"))
+    # validées et appliquées sous le même verrou (aucune écriture entre les deux)
+    store_ops, results, _ = TASKS.apply_batch(lambda store: build_batch(store, ops))
 
+    if not request.is_json:
+        return redirect(url_for("index"))
+    return jsonify({"applied": store_ops is not None, "results": results}), (200 if store_ops is not None else 422)
 
 
-@app.get("/export.csv")
-def export_csv():
-    tasks = load_tasks()
-    items = ordered_items(tasks)
+@app.post("/import")
+def import_tasks():
+    # import en masse (CSV ou NDJSON) : une seule écriture et un seul backup
+    upload = request.files.get("file")
+    if upload is None:
+        abort(400)
 
-    out = io.StringIO()
-    writer = csv.writer(out)
-    writer.writerow(["num", "title", "done", "pos"])
+    fmt = detect_format(upload.filename, request.form.get("format"))
+    tasks, report = read_import(upload.stream, fmt)
+    if tasks:
+        TASKS.import_tasks(tasks)
+
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(report)
+    return render_template("import.html", report=report)
+
+
+BACKUPS_PAGE_SIZE = 20
+
+app.jinja_env.filters["datetime"] = lambda ts: datetime.fromtimestamp(ts).strftime("%d/%m/%Y %H:%M:%S")
 
-    for display_id, (real_i, t) in enumerate(items, start=1):
-        writer.writerow([display_id, t.get("title", ""), t.get("done", False), t.get("pos", "")])
 
-    return Response(
-        out.getvalue(),
-        mimetype="text/csv; charset=utf-8",
-        headers={"Content-Disposition": "attachment; filename=tasks.csv"},
-    )
 @app.get("/backups")
+@conditional(lambda: file_source(BACKUPS.manifest_path))
 def backups():
-    BACKUP_DIR.mkdir(exist_ok=True)
-    files = sorted(BACKUP_DIR.glob("tasks-*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
-    items = []
-    for p in files:
-        st = p.stat()
-        items.append({
-            "name": p.name,
-            "mtime": st.st_mtime,
-            "size": st.st_size,
-        })
-    return render_template("backups.html", backups=items)
-
-
-def safe_backup_path(name: str) -> Path:
+    # une page du manifest (dates, tailles et compteurs enregistrés) : aucun accès aux snapshots
+    page = request.args.get("page", "")
+    page = int(page) if page.isdigit() and int(page) > 0 else 1
+    entries, total = BACKUPS.page((page - 1) * BACKUPS_PAGE_SIZE, BACKUPS_PAGE_SIZE)
+    pages = max(1, -(-total // BACKUPS_PAGE_SIZE))
+    return render_template("backups.html", backups=entries, total=total, page=page, pages=pages)
+
+
+def safe_backup_entry(name: str) -> dict:
     if "/" in name or "\\" in name:
         abort(400)
     if not (name.startswith("tasks-") and name.endswith(".json")):
         abort(400)
 
-    p = (BACKUP_DIR / name).resolve()
-    if p.parent != BACKUP_DIR.resolve():
-        abort(400)
-    if not p.exists():
+    entry = BACKUPS.get(name)
+    if entry is None:
         abort(404)
-    return p
+    return entry
+
+
+@app.get("/backups/<name>/diff")
+def backup_diff(name):
+    # aperçu avant restauration : le backup est lu tâche par tâche et comparé au store
+    safe_backup_entry(name)
+    with BACKUPS.open(name) as f:
+        diff = diff_snapshot(iter_list(f), TASKS)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(diff)
+    return render_template("backup_diff.html", name=name, entry=BACKUPS.get(name), diff=diff)
 
 
 @app.post("/restore/<path:name>")
 def restore_backup(name):
-    src = safe_backup_path(name)
+    safe_backup_entry(name)
+    data = BACKUPS.read(name)
 
-    backup_tasks_file()
+    # compacte (et sauvegarde) l'état courant avant de l'écraser
+    TASKS.compact(force=True)
+    BACKUP_WORKER.flush()
 
-    shutil.copy2(src, DATA_FILE)
+    save_tasks(decode(data))
 
     return redirect(url_for("index"))
 
+
+@app.get("/cache")
+def cache_stats():
+    return jsonify(dict(TASKS.stats(), backups=BACKUP_WORKER.stats()))
+
+
+@app.get("/metrics")
+def metrics():
+    # format texte Prometheus ; compteurs des caches et des backups lus au moment de l'export.
+    # En multi-salons : une série par salon ouvert (étiquette tenant) + état du LRU
+    gauges = []
+    for tenant in all_tenants():
+        labels = {"tenant": tenant.name} if TENANT_MODE else {}
+        stats = tenant.tasks.stats()
+        total, done = tenant.tasks.counts()
+        backup_stats = tenant.backup_worker.stats()
+        gauges += [
+            ("tasks", "gauge", "Tâches enregistrées", dict(labels, state="total"), total),
+            ("tasks", "gauge", "Tâches enregistrées", dict(labels, state="done"), done),
+            ("backups_requested_total", "counter", "Sauvegardes demandées", labels, backup_stats["requested"]),
+            ("backups_written_total", "counter", "Sauvegardes écrites", labels, backup_stats["written"]),
+            ("backups_pending", "gauge", "Sauvegarde en attente", labels, int(backup_stats["pending"])),
+            ("backups_stored", "gauge", "Sauvegardes dans le manifest", labels, len(tenant.backups.list())),
+        ]
+        caches = [("renders", tenant.renders.stats()), ("pages", tenant.pages.stats())]
+        if "hits" in stats:
+            caches.insert(0, ("tasks", stats))
+        for name, s in caches:
+            gauges.append(("cache_hits_total", "counter", "Accès aux caches servis depuis la mémoire", dict(labels, cache=name), s["hits"]))
+            gauges.append(("cache_misses_total", "counter", "Accès aux caches qui ont dû recharger", dict(labels, cache=name), s["misses"]))
+    gauges.append(("shared_loads_total", "counter", "Lectures de contenu.json (partagé entre salons)", {}, CONTENU.loads))
+    if TENANT_MODE:
+        t = TENANTS.stats()
+        gauges += [
+            ("tenants_open", "gauge", "Salons ouverts en mémoire", {}, t["open"]),
+            ("tenants_memory_bytes", "gauge", "Mémoire estimée des salons ouverts", {}, t["memory"]),
+            ("tenants_memory_budget_bytes", "gauge", "Budget mémoire des salons ouverts", {}, t["budget"]),
+            ("tenants_opened_total", "counter", "Ouvertures de salons", {}, t["opened"]),
+            ("tenants_evicted_total", "counter", "Salons fermés pour respecter le budget", {}, t["evicted"]),
+        ]
+    return Response(METRICS.render(gauges), mimetype="text/plain; version=0.0.4")
+
 @app.get("/settings")
 def settings():
     cfg = load_config()
     saved = request.args.get("saved") == "1"
-    return render_template("settings.html", cfg=cfg, saved=saved)
+    return render_template("settings.html", cfg=cfg, saved=saved, backends=STORAGE_BACKENDS, formats=FORMATS)
     print("saved=", saved)
 
 @app.post("/settings")
 def settings_save():
-    cfg = load_config()
+    global PAGE_SIZE
+    changes = {}
 
     keep_raw = (request.form.get("keep_backups") or "").strip()
     port_raw = (request.form.get("port") or "").strip()
 
     if keep_raw.isdigit():
         keep = int(keep_raw)
-        cfg["keep_backups"] = max(1, min(keep, 500))  # limite raisonnable
+        changes["keep_backups"] = max(1, min(keep, 500))  # limite raisonnable
+        for tenant in all_tenants():
+            tenant.backups.keep = changes["keep_backups"]
+        if TENANTS:
+            TENANTS.cfg["keep_backups"] = changes["keep_backups"]
     if port_raw.isdigit():
         port = int(port_raw)
-        cfg["port"] = max(1024, min(port, 65535))
-
-    save_config(cfg)
-    return redirect(url_for("settings", saved=1))
+        changes["port"] = max(1024, min(port, 65535))
 
+    page_raw = (request.form.get("page_size") or "").strip()
+    if page_raw.isdigit():
+        changes["page_size"] = max(10, min(int(page_raw), 500))
+        PAGE_SIZE = changes["page_size"]
 
-PLAN_FILE = Path("plan.json")
-
-def load_plan():
-    if not PLAN_FILE.exists():
-        return {"sector": "coiffeur", "week": 1, "days": []}
-    return json.loads(PLAN_FILE.read_text(encoding="utf-8"))
+    storage = (request.form.get("storage") or "").strip()
+    if storage in STORAGE_BACKENDS:
+        changes["storage"] = storage
 
-def save_plan(plan):
-    PLAN_FILE.write_text(json.dumps(plan, ensure_ascii=False, indent=2), encoding="utf-8")
+    data_format = (request.form.get("data_format") or "").strip()
+    if data_format in FORMATS:
+        changes["data_format"] = data_format
+        set_format(data_format)  # chaque fichier change de format à sa prochaine écriture
 
-
-
-def get_current_day_from_plan(plan):
-    for d in plan.get("days", []):
-        items = d.get("items", [])
-        if items and any(not it.get("done") for it in items):
-            return d.get("day")
-    return None
+    # relu / réécrit sans perdre une écriture concurrente (voir storage.py)
+    update_data(CONFIG_FILE, lambda cfg: cfg.update(changes), default=load_config, fmt="json")
+    return redirect(url_for("settings", saved=1))
 
 
 @app.get("/today")
+@conditional(plan_source, lambda: file_source(CONTENU_FILE), lambda: file_source(current_tenant().salon_file))
 def today_page():
-    plan = load_plan()
-    current_day = get_current_day_from_plan(plan)
-
-    day_obj = None
-
-    
-    if current_day is None and plan.get("days"):
-        day_obj = plan["days"][-1]
-        current_day = day_obj.get("day")
-    else:
-        for d in plan.get("days", []):
-            if d.get("day") == current_day:
-                day_obj = d
-                break
+    salon = load_salon()
+    plan, rendered = rendered_plan(salon)
+    n = plan.active_index()
+    day_obj = rendered["days"][n] if n is not None else None
+    current_day = day_obj.get("day") if day_obj else None
 
     actions = (day_obj.get("items", []) if day_obj else [])[:3]
-    salon = load_salon()
-    for a in actions:
-        a["title"] = apply_salon(a.get("title",""), salon)
-        a["script"] = apply_salon(a.get("script",""), salon)
     accroche = ""
     post_texte = ""
 
     try:
-        contenu = load_contenu()
+        contenu = rendered_contenu(salon)
         for dd in contenu.get("days", []):
             if dd.get("day") == (current_day or 1):
                accroche = dd.get("reel", {}).get("hook", "")   # clé JSON inchangée
                post_texte = dd.get("post", {}).get("caption", "")
                break
-
-        salon = load_salon()
-        accroche = apply_salon(accroche, salon)
-        post_texte = apply_salon(post_texte, salon)
     except Exception:
         pass
     return render_template("today.html", actions=actions, day_number=current_day or 1, current_day=current_day or 1, accroche=accroche, post_texte=post_texte)
@@ -361,67 +533,50 @@ def today_page():
 
 @app.post("/today/action/<action_id>")
 def today_toggle_action(action_id):
-    plan = load_plan()
-
-    for d in plan.get("days", []):
-        for it in d.get("items", []):
-            if it.get("id") == action_id:
-                it["done"] = not bool(it.get("done"))
-                save_plan(plan)
-                return redirect(url_for("today_page"))
-
+    PLAN.toggle(action_id)
     return redirect(url_for("today_page"))
 
 
 @app.post("/today/reset")
 def today_reset():
-    plan = load_plan()
-    current_day = get_current_day_from_plan(plan)
-
-    if current_day is None and plan.get("days"):
-        current_day = plan["days"][-1].get("day")
-
-    for d in plan.get("days", []):
-        if d.get("day") == current_day:
-            for it in d.get("items", []):
-                it["done"] = False
-            break
-
-    save_plan(plan)
+    day_obj = PLAN.load().active_day()
+    if day_obj is not None:
+        PLAN.reset_day(day_obj.get("day"))
     return redirect(url_for("today_page"))
 
 
 @app.get("/plan")
+@conditional(plan_source, lambda: file_source(current_tenant().salon_file))
 def plan_page():
-    plan = load_plan()
-    salon = load_salon()
-    for d in plan.get("days", []):
-        for it in d.get("items", []):
-            it["title"] = apply_salon(it.get("title",""), salon)
-            it["script"] = apply_salon(it.get("script",""), salon)
-    return render_template("plan.html", plan=plan)
+    _, rendered = rendered_plan(load_salon())
+    return render_template("plan.html", plan=rendered)
 
 @app.post("/plan/toggle/<item_id>")
 def plan_toggle(item_id):
-    plan = load_plan()
-    for d in plan.get("days", []):
-        for it in d.get("items", []):
-            if it.get("id") == item_id:
-                it["done"] = not bool(it.get("done"))
-                save_plan(plan)
-                return redirect(url_for("plan_page"))
+    PLAN.toggle(item_id)
     return redirect(url_for("plan_page"))
 
 
-SUIVI_FILE = Path("suivi.json")
-
 def load_suivi():
-    if not SUIVI_FILE.exists():
+    raw = read_bytes(current_tenant().suivi_file)
+    if raw is None:
         return {"week": 1, "data": {"leads": 0, "bookings": 0, "noshow": 0, "revenue": 0, "reviews": 0}}
-    return json.loads(SUIVI_FILE.read_text(encoding="utf-8"))
-
-def save_suivi(suivi):
-    SUIVI_FILE.write_text(json.dumps(suivi, ensure_ascii=False, indent=2), encoding="utf-8")
+    return decode(raw)
+
+def record_kpi(before, after):
+    # historique : totaux de la semaine du suivi, seulement s'ils ont changé
+    # (le premier enregistrement reprend les valeurs déjà saisies)
+    after = {"week": after.get("week", 1), "data": after.get("data", {})}
+    if before != after or not KPI.exists():
+        KPI.append(after["week"], after["data"])
+
+def history_args():
+    # ?grain=day|week|month&from=&to= (clés de case, ex. 2026-W03) ; par défaut les 12 dernières semaines
+    grain = request.args.get("grain", "week")
+    if grain not in GRAINS:
+        grain = "week"
+    start, end = request.args.get("from") or None, request.args.get("to") or None
+    return grain, start, end, None if start or end else 12
 
 @app.get("/suivi")
 def suivi_page():
@@ -431,77 +586,75 @@ def suivi_page():
     if data.get("bookings", 0) >= 5: score += 1
     if data.get("reviews", 0) >= 3: score += 1
     if data.get("noshow", 0) <= 2: score += 1
-    return render_template("suivi.html", suivi=suivi, data=data, score=score)
+    grain, start, end, last = history_args()
+    history = KPI.series(grain, start, end, last)
+    peak = max([b["leads"] for b in history] + [b["bookings"] for b in history] + [1])
+    return render_template("suivi.html", suivi=suivi, data=data, score=score,
+                           history=history, grain=grain, grains=GRAINS, peak=peak, total=KPI.total())
 
 @app.post("/suivi/save")
 def suivi_save():
-    suivi = load_suivi()
-    d = suivi.get("data", {})
-
     def to_int(name):
         raw = (request.form.get(name) or "0").strip()
         return int(raw) if raw.lstrip("-").isdigit() else 0
 
-    d["leads"] = max(0, to_int("leads"))
-    d["bookings"] = max(0, to_int("bookings"))
-    d["noshow"] = max(0, to_int("noshow"))
-    d["revenue"] = max(0, to_int("revenue"))
-    d["reviews"] = max(0, to_int("reviews"))
-
-    suivi["data"] = d
-    save_suivi(suivi)
+    def mutate(suivi):
+        before = {"week": suivi.get("week", 1), "data": dict(suivi.get("data", {}))}
+        d = suivi.get("data", {})
+        d["leads"] = max(0, to_int("leads"))
+        d["bookings"] = max(0, to_int("bookings"))
+        d["noshow"] = max(0, to_int("noshow"))
+        d["revenue"] = max(0, to_int("revenue"))
+        d["reviews"] = max(0, to_int("reviews"))
+        suivi["data"] = d
+        # nouvelle semaine : ses totaux repartent de ce qui est saisi
+        week = to_int("week")
+        if week >= 1:
+            suivi["week"] = week
+        return before, suivi
+
+    # relu / réécrit sans perdre une écriture concurrente (voir storage.py)
+    record_kpi(*update_data(current_tenant().suivi_file, mutate, default=load_suivi))
     return redirect(url_for("suivi_page"))
 
 
-CONTENU_FILE = Path("contenu.json")
-
 def load_contenu():
-    if not CONTENU_FILE.exists():
+    # partagé entre salons : à ne pas modifier (render_contenu en fait une copie)
+    data = CONTENU.load()
+    if data is None:
         return {"sector": "coiffeur", "week": 1, "days": []}
-    return json.loads(CONTENU_FILE.read_text(encoding="utf-8"))
+    return data
 
 @app.get("/contenu")
+@conditional(lambda: file_source(CONTENU_FILE), lambda: file_source(current_tenant().salon_file))
 def contenu_page():
-    data = load_contenu()
     salon = load_salon()
-    for d in data.get("days", []):
-        d["reel"]["hook"] = apply_salon(d["reel"].get("hook",""), salon)
-        d["reel"]["script"] = apply_salon(d["reel"].get("script",""), salon)
-        d["post"]["title"] = apply_salon(d["post"].get("title",""), salon)
-        d["post"]["caption"] = apply_salon(d["post"].get("caption",""), salon)
-        d["post"]["visual"] = apply_salon(d["post"].get("visual",""), salon)
-        d["story"]["slides"] = [apply_salon(s, salon) for s in d["story"].get("slides", [])]
-        
+    data = rendered_contenu(salon)
     reseau = salon.get("reseau_1", "Instagram")
     return render_template("contenu.html", contenu=data, salon=salon, reseau=reseau)
 
-SALON_FILE = Path("salon.json")
-
 def load_salon():
-    if not SALON_FILE.exists():
+    raw = read_bytes(current_tenant().salon_file)
+    if raw is None:
         return {"nom_salon": "Mon salon", "ville": "", "telephone": "", "lien_avis_google": "", "cta": "DM RDV", "reseau_1": "Instagram",
             "reseau_2": "Google",
             "reseau_3": "Facebook"}
     
-    salon = json.loads(SALON_FILE.read_text(encoding="utf-8"))
+    salon = decode(raw)
     salon.setdefault("reseau_1", "Instagram")
     salon.setdefault("reseau_2", "Google")
     salon.setdefault("reseau_3", "Facebook")
     return salon
 
 
-def save_salon(data):
-    SALON_FILE.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+def rendered_plan(salon):
+    plan = PLAN.load()
+    key = ("plan", salon_key(salon), PLAN.version)
+    return plan, RENDERS.get(key, lambda: render_plan(plan.data, compile_salon(salon)))
 
-def apply_salon(text, salon):
-    if not isinstance(text, str):
-        return text
-    return (text
-        .replace("[VILLE]", salon.get("ville","") or "[VILLE]")
-        .replace("[LIEN]", salon.get("lien_avis_google","") or "[LIEN]")
-        .replace("[téléphone/DM]", salon.get("telephone","") or (salon.get("cta","DM RDV")))
-        .replace("[OFFRE]", "Offre du moment")  # optionnel, on pourra le rendre configurable
-    )
+def rendered_contenu(salon):
+    key = ("contenu", salon_key(salon), file_signature(CONTENU_FILE))
+    return RENDERS.get(key, lambda: render_contenu(load_contenu(), compile_salon(salon)))
 
 @app.get("/salon")
 def salon_page():
@@ -511,19 +664,251 @@ def salon_page():
 
 @app.post("/salon")
 def salon_save():
-    salon = load_salon()
-    salon["nom_salon"] = (request.form.get("nom_salon") or "").strip() or "Mon salon"
-    salon["ville"] = (request.form.get("ville") or "").strip()
-    salon["telephone"] = (request.form.get("telephone") or "").strip()
-    salon["lien_avis_google"] = (request.form.get("lien_avis_google") or "").strip()
-    salon["cta"] = (request.form.get("cta") or "").strip() or "DM RDV"
+    def mutate(salon):
+        salon["nom_salon"] = (request.form.get("nom_salon") or "").strip() or "Mon salon"
+        salon["ville"] = (request.form.get("ville") or "").strip()
+        salon["telephone"] = (request.form.get("telephone") or "").strip()
+        salon["lien_avis_google"] = (request.form.get("lien_avis_google") or "").strip()
+        salon["cta"] = (request.form.get("cta") or "").strip() or "DM RDV"
+
+        salon["reseau_1"] = (request.form.get("reseau_1") or "").strip() or "Instagram"
+        salon["reseau_2"] = (request.form.get("reseau_2") or "").strip() or "Google"
+        salon["reseau_3"] = (request.form.get("reseau_3") or "").strip() or "Facebook"
+
+        # champs personnalisés : une ligne "[CLÉ] = valeur" par champ
+        placeholders = {}
+        for line in (request.form.get("placeholders") or "").splitlines():
+            key, sep, value = line.partition("=")
+            if sep and key.strip():
+                placeholders[key.strip()] = value.strip()
+        salon["placeholders"] = placeholders
+
+    # relu / réécrit sans perdre une écriture concurrente (voir storage.py)
+    update_data(current_tenant().salon_file, mutate, default=load_salon)
+    return redirect(url_for("salon_page", saved=1))
 
-    salon["reseau_1"] = (request.form.get("reseau_1") or "").strip() or "Instagram"
-    salon["reseau_2"] = (request.form.get("reseau_2") or "").strip() or "Google"
-    salon["reseau_3"] = (request.form.get("reseau_3") or "").strip() or "Facebook"
+# --- API JSON v1 -------------------------------------------------------------
+# Les pages appellent ces routes en fetch : chaque mutation ne renvoie que la
+# ressource modifiée, avec son ETag. Un client qui envoie If-Match (l'ETag lu)
+# reçoit 412 + la version actuelle si quelqu'un l'a modifiée entre-temps.
+
+API_PAGE_MAX = 500
+
+app.jinja_env.globals["task_etag"] = task_etag
+app.jinja_env.globals["plan_etag"] = lambda item_id: content_etag(PLAN.load().item(item_id))
+
+
+def api_error(status, message, **extra):
+    resp = jsonify(dict(error=message, **extra))
+    resp.status_code = status
+    return resp
+
+
+def api_body():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(api_error(400, "corps JSON attendu"))
+    return body
+
+
+def if_match():
+    # ETags acceptés, ou None sans en-tête If-Match
+    m = request.if_match
+    if not m:
+        return None
+    return {"*"} if m.star_tag else m.as_set()
+
+
+def api_resource(data, etag, status=200):
+    if status == 200 and request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = jsonify(data)
+        resp.status_code = status
+    resp.set_etag(etag)
+    return resp
+
+
+def api_conflict(e, to_json, etag=content_etag):
+    # 412 avec la version actuelle : le client peut l'afficher ou réessayer
+    if e.current is None:
+        return api_error(404, "introuvable")
+    resp = api_error(412, "modifié entre-temps", current=to_json(e.current))
+    resp.set_etag(etag(e.current))
+    return resp
+
+
+def task_json(t):
+    return {"id": t["id"], "title": t.get("title", ""), "done": bool(t.get("done")), "pos": t.get("pos"), "etag": task_etag(t)}
+
+
+@app.get("/api/v1/tasks")
+@conditional(tasks_source)
+def api_tasks():
+    limit = request.args.get("limit", "")
+    limit = max(1, min(int(limit), API_PAGE_MAX)) if limit.isdigit() else PAGE_SIZE
+    page = TASKS.page(
+        limit,
+        after=decode_cursor(request.args.get("after")),
+        before=decode_cursor(request.args.get("before")),
+        q=(request.args.get("q") or "").strip().lower(),
+    )
+    return {
+        "items": [task_json(t) for _, t in page["items"]],
+        "start": page["start"],
+        "total": page["total"],
+        "done": page["done"],
+        "prev": page["prev"],
+        "next": page["next"],
+    }
+
+
+@app.post("/api/v1/tasks")
+def api_task_create():
+    body = api_body()
+    title = body.get("title")
+    if not isinstance(title, str) or not title.strip():
+        return api_error(400, "titre vide")
+    task = {"title": title.strip(), "done": body.get("done") is True}
+    task_id = TASKS.apply_batch(lambda store: (append_ops(store, [task]), None))[2][0]
+    t = TASKS.get(task_id)
+    resp = api_resource(task_json(t), task_etag(t), status=201)
+    resp.headers["Location"] = url_for("api_task", task_id=task_id)
+    return resp
+
+
+@app.get("/api/v1/tasks/<int:task_id>")
+def api_task(task_id):
+    t = TASKS.get(task_id)
+    if t is None:
+        return api_error(404, "tâche introuvable")
+    return api_resource(task_json(t), task_etag(t))
+
+
+@app.patch("/api/v1/tasks/<int:task_id>")
+def api_task_update(task_id):
+    # {"title": ..., "done": true|false, "before": id|null} ; chaque champ est facultatif
+    body = api_body()
+    t = TASKS.get(task_id)
+    if t is None:
+        return api_error(404, "tâche introuvable")
+
+    ops = []
+    if "title" in body:
+        title = body["title"]
+        if not isinstance(title, str) or not title.strip():
+            return api_error(400, "titre vide")
+        ops.append({"op": "edit", "id": task_id, "title": title.strip()})
+    if "done" in body:
+        if not isinstance(body["done"], bool):
+            return api_error(400, "done doit être true ou false")
+        ops.append({"op": "toggle", "id": task_id, "done": body["done"]})
+    if "before" in body:
+        before = body["before"]
+        if before is not None and (isinstance(before, bool) or not isinstance(before, int)):
+            return api_error(400, "before doit être un id ou null")
+        ops.extend(move_ops(TASKS, task_id, before))
+
+    if ops:
+        try:
+            TASKS.apply(ops, expect={task_id: if_match()})
+        except PreconditionFailed as e:
+            return api_conflict(e, task_json, task_etag)
+    t = TASKS.get(task_id)
+    if t is None:
+        return api_error(404, "tâche introuvable")
+    return api_resource(task_json(t), task_etag(t))
+
+
+@app.delete("/api/v1/tasks/<int:task_id>")
+def api_task_delete(task_id):
+    if TASKS.get(task_id) is None:
+        return api_error(404, "tâche introuvable")
+    try:
+        TASKS.apply([{"op": "delete", "id": task_id}], expect={task_id: if_match()})
+    except PreconditionFailed as e:
+        return api_conflict(e, task_json, task_etag)
+    return Response(status=204)
+
+
+def plan_item_json(it):
+    return dict(it, etag=content_etag(it))
+
+
+@app.get("/api/v1/plan/items/<item_id>")
+def api_plan_item(item_id):
+    it = PLAN.load().item(item_id)
+    if it is None:
+        return api_error(404, "action introuvable")
+    return api_resource(plan_item_json(it), content_etag(it))
+
+
+@app.patch("/api/v1/plan/items/<item_id>")
+def api_plan_item_update(item_id):
+    # {"done": true|false}
+    done = api_body().get("done")
+    if not isinstance(done, bool):
+        return api_error(400, "done doit être true ou false")
+    try:
+        it = PLAN.update_item(item_id, done, expect=if_match())
+    except PreconditionFailed as e:
+        return api_conflict(e, plan_item_json)
+    if it is None:
+        return api_error(404, "action introuvable")
+    return api_resource(plan_item_json(it), content_etag(it))
+
+
+SUIVI_FIELDS = ("leads", "bookings", "noshow", "revenue", "reviews")
+
+
+def suivi_json(suivi):
+    return dict(suivi, etag=content_etag(suivi))
+
+
+@app.get("/api/v1/suivi")
+def api_suivi():
+    suivi = load_suivi()
+    return api_resource(suivi_json(suivi), content_etag(suivi))
+
+
+@app.patch("/api/v1/suivi")
+def api_suivi_update():
+    # {"week": n, "data": {"leads": n, ...}} ; seuls les champs envoyés changent
+    body = api_body()
+    changes = body.get("data") or {}
+    if not isinstance(changes, dict) or any(
+        k not in SUIVI_FIELDS or isinstance(v, bool) or not isinstance(v, int) or v < 0 for k, v in changes.items()
+    ):
+        return api_error(400, f"data : entiers positifs parmi {', '.join(SUIVI_FIELDS)}")
+    week = body.get("week")
+    if week is not None and (isinstance(week, bool) or not isinstance(week, int) or week < 1):
+        return api_error(400, "week doit être un entier positif")
+    accepted = if_match()
+    before = {}
+
+    def mutate(suivi):
+        check_etag("suivi", suivi, accepted)
+        before.clear()
+        before.update(week=suivi.get("week", 1), data=dict(suivi.get("data", {})))
+        suivi.setdefault("data", {}).update(changes)
+        if week is not None:
+            suivi["week"] = week
+        return suivi
+
+    try:
+        suivi = update_data(current_tenant().suivi_file, mutate, default=load_suivi)
+    except PreconditionFailed as e:
+        return api_conflict(e, suivi_json)
+    record_kpi(before, suivi)
+    return api_resource(suivi_json(suivi), content_etag(suivi))
+
+
+@app.get("/api/v1/suivi/history")
+def api_suivi_history():
+    # ?grain=day|week|month&from=&to= : sommes, taux de conversion et de no-show par case
+    grain, start, end, last = history_args()
+    return {"grain": grain, "buckets": KPI.series(grain, start, end, last), "total": KPI.total()}
 
-    save_salon(salon)
-    return redirect(url_for("salon_page", saved=1))
 
 if __name__ == "__main__":
     cfg = load_config()
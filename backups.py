@@ -0,0 +1,295 @@
+import gzip
+import hashlib
+import io
+import json
+import threading
+import time
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from storage import FileLock, atomic_write, file_signature, write_json, read_bytes, iter_list
+from metrics import span
+
+
+class BackupStore:
+    # sauvegardes adressées par contenu : chaque snapshot est haché (sha256),
+    # stocké une seule fois compressé dans objects/<hash>.gz, et référencé par
+    # une entrée du manifest. Lister, élaguer et restaurer ne lisent que le
+    # manifest, sans parcourir le dossier. Chaque entrée garde aussi le nombre
+    # de tâches (faites / total) du snapshot, pour la liste paginée.
+    def __init__(self, directory, keep=30):
+        self.dir = Path(directory)
+        self.objects = self.dir / "objects"
+        self.manifest_path = self.dir / "manifest.json"
+        self.keep = keep
+        self._entries = None
+        self._by_name = {}
+        self._sig = None
+        self._lock = threading.RLock()
+        self._flock = FileLock(self.manifest_path)  # autres processus
+
+    def _load(self):
+        # relu si un autre processus a réécrit le manifest
+        sig = file_signature(self.manifest_path)
+        if self._entries is None or (sig is not None and sig != self._sig):
+            if sig is not None:
+                self._entries = json.loads(read_bytes(self.manifest_path))
+                self._by_name = {e["name"]: e for e in self._entries}
+                self._sig = sig
+            else:
+                # pas de manifest : import des anciens backups sous le verrou de
+                # fichier (un autre processus a pu le faire entre-temps)
+                with self._flock:
+                    if file_signature(self.manifest_path) is not None:
+                        self._entries = None
+                        return self._load()
+                    self._entries = []
+                    self._by_name = {}
+                    self._import_legacy()
+        return self._entries
+
+    def _import_legacy(self):
+        # anciens backups : copies complètes tasks-*.json (une seule fois) ;
+        # supprimés seulement une fois le manifest qui référence leurs copies écrit
+        if not self.dir.exists():
+            return
+        files = sorted(self.dir.glob("tasks-*.json"), key=lambda p: p.stat().st_mtime)
+        for p in files:
+            self._add(p.read_bytes(), name=p.name, mtime=p.stat().st_mtime, dedupe=False)
+        if files:
+            self._write_manifest()
+        for p in files:
+            p.unlink()
+
+    def _write_manifest(self):
+        self.dir.mkdir(exist_ok=True)
+        write_json(self.manifest_path, self._entries, indent=None)
+        self._sig = file_signature(self.manifest_path)
+
+    def _object(self, digest):
+        return self.objects / f"{digest}.gz"
+
+    def _add(self, data, name=None, mtime=None, dedupe=True):
+        entries = self._load()
+        digest = hashlib.sha256(data).hexdigest()
+        if dedupe and entries and entries[-1]["hash"] == digest:
+            return None  # rien n'a changé depuis le dernier backup
+
+        obj = self._object(digest)
+        if not obj.exists():
+            self.objects.mkdir(parents=True, exist_ok=True)
+            atomic_write(obj, gzip.compress(data))
+
+        now = datetime.now()
+        entry = {
+            "name": name or f"tasks-{now.strftime('%Y%m%d-%H%M%S-%f')}.json",
+            "hash": digest,
+            "mtime": mtime if mtime is not None else now.timestamp(),
+            "size": len(data),
+        }
+        entry.update(snapshot_counts(io.BytesIO(data)))
+        entries.append(entry)
+        self._by_name[entry["name"]] = entry
+        return entry
+
+    @span("backup.add")
+    def add(self, data):
+        with self._lock, self._flock:
+            entry = self._add(data)
+            if entry is None:
+                return None
+            if not self.prune():
+                self._write_manifest()
+            return entry
+
+    @span("backup.prune")
+    def prune(self, keep=None):
+        with self._lock, self._flock:
+            keep = self.keep if keep is None else keep
+            entries = self._load()
+            if len(entries) <= keep:
+                return False
+            removed = entries[:len(entries) - keep]
+            del entries[:len(entries) - keep]
+            alive = {e["hash"] for e in entries}
+            for e in removed:
+                self._by_name.pop(e["name"], None)
+                if e["hash"] not in alive:
+                    self._object(e["hash"]).unlink(missing_ok=True)
+            self._write_manifest()
+            return True
+
+    def list(self):
+        # du plus récent au plus ancien
+        with self._lock:
+            return list(reversed(self._load()))
+
+    def page(self, start=0, limit=20):
+        # entrées [start, start + limit) du plus récent au plus ancien, et le total ;
+        # les anciennes entrées sans compteurs sont complétées une fois
+        with self._lock:
+            entries = self._load()
+            end = max(0, len(entries) - start)
+            chosen = entries[max(0, end - limit):end][::-1]
+            if any("tasks" not in e for e in chosen):
+                with self._flock:
+                    for e in chosen:
+                        if "tasks" not in e:
+                            with self.open(e["name"]) as f:
+                                e.update(snapshot_counts(f))
+                    self._write_manifest()
+            return chosen, len(entries)
+
+    def get(self, name):
+        with self._lock:
+            self._load()
+            return self._by_name.get(name)
+
+    def read(self, name):
+        entry = self.get(name)
+        if entry is None:
+            return None
+        return gzip.decompress(read_bytes(self._object(entry["hash"])))
+
+    def open(self, name):
+        # snapshot décompressé au fil de la lecture (voir iter_list)
+        entry = self.get(name)
+        if entry is None:
+            return None
+        return gzip.open(self._object(entry["hash"]), "rb")
+
+
+def snapshot_counts(f):
+    total = done = 0
+    for t in iter_list(f):
+        total += 1
+        done += bool(isinstance(t, dict) and t.get("done"))
+    return {"tasks": total, "done": done}
+
+
+DIFF_FIELDS = ("title", "done", "pos")
+
+DIFF_BATCH = 1000
+
+
+@span("backup.diff")
+def diff_snapshot(snapshot, current, limit=50):
+    # ce que changerait une restauration : snapshot = tâches du backup (itérateur),
+    # current = store actuel. Une seule passe sur le backup, tâche par tâche ;
+    # seuls les ids vus sont gardés. Au plus `limit` exemples par catégorie.
+    #   restored : dans le backup seulement (reviendraient)
+    #   removed  : actuelles absentes du backup (disparaîtraient)
+    #   changed  : titre, état ou position différents
+    seen = set()
+    counts = {"restored": 0, "removed": 0, "changed": 0, "unchanged": 0}
+    samples = {"restored": [], "removed": [], "changed": []}
+
+    def sample(kind, item):
+        counts[kind] += 1
+        if len(samples[kind]) < limit:
+            samples[kind].append(item)
+
+    snapshot = iter(snapshot)
+    while True:
+        # par paquets : un seul accès au store (get_many) pour DIFF_BATCH tâches
+        chunk = list(islice(snapshot, DIFF_BATCH))
+        if not chunk:
+            break
+        chunk = [t for t in chunk if isinstance(t, dict)]
+        found = current.get_many([t["id"] for t in chunk if type(t.get("id")) is int])
+        for t in chunk:
+            key = t.get("id")
+            seen.add(key)
+            cur = found.get(key) if type(key) is int else None
+            if cur is None:
+                sample("restored", {"id": key, "title": t.get("title", ""), "done": bool(t.get("done"))})
+                continue
+            cur = cur[1]
+            fields = {}
+            for name in DIFF_FIELDS:
+                if name not in t:
+                    continue
+                old, new = cur.get(name), t[name]
+                if name == "done":
+                    old, new = bool(old), bool(new)
+                if old != new:
+                    fields[name] = {"current": old, "backup": new}
+            if fields:
+                sample("changed", {"id": key, "title": cur.get("title", ""), "fields": fields})
+            else:
+                counts["unchanged"] += 1
+
+    for key, t in current.ordered():
+        if key not in seen:
+            sample("removed", {"id": key, "title": t.get("title", ""), "done": bool(t.get("done"))})
+    return dict(counts, samples=samples)
+
+
+class BackupWorker:
+    # sauvegardes hors du chemin des requêtes : submit() ne fait que noter la
+    # demande ; un thread attend `delay` secondes (les demandes arrivées entre-temps
+    # sont regroupées) puis lit le fichier et l'ajoute au BackupStore, qui élague
+    # seulement les entrées les plus anciennes du manifest.
+    def __init__(self, backups, read, delay=2.0):
+        self.backups = backups
+        self.read = read
+        self.delay = delay
+        self.requested = 0
+        self.written = 0
+        self._pending_since = None
+        self._stopping = False
+        self._thread = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+    def submit(self):
+        with self._cond:
+            self.requested += 1
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            if self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._run, name="backups", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending_since is None and not self._stopping:
+                    self._cond.wait()
+                if self._pending_since is None:
+                    return
+                # flush() appelé entre-temps (restauration) : plus rien en attente
+                while not self._stopping and self._pending_since is not None:
+                    remaining = self._pending_since + self.delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ backup : {e}")
+
+    @span("backup.flush")
+    def flush(self):
+        # exécute tout de suite la sauvegarde en attente (restauration, arrêt)
+        with self._flush_lock:
+            with self._cond:
+                if self._pending_since is None:
+                    return
+                self._pending_since = None
+            data = self.read()
+            if data is not None and self.backups.add(data) is not None:
+                self.written += 1
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {"requested": self.requested, "written": self.written, "pending": self._pending_since is not None}
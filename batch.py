@@ -0,0 +1,60 @@
+BATCH_OPS = ("toggle", "delete", "edit", "move")
+
+
+def is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def build_batch(store, ops):
+    # valide toutes les opérations sur un seul état de la liste et les traduit
+    # en opérations du store. Tout ou rien : si une opération est invalide,
+    # rien n'est appliqué. Renvoie (ops du store ou None, résultat par op).
+    # À appeler via store.apply_batch : validation et écriture sous le même verrou.
+    wanted = [op.get("id") for op in ops if isinstance(op, dict)]
+    found = store.get_many([k for k in wanted if is_id(k)])
+
+    store_ops = []
+    results = []
+    done_state = {}
+    deleted = set()
+
+    for k, op in enumerate(ops):
+        error = None
+        kind = op.get("op") if isinstance(op, dict) else None
+        key = op.get("id") if isinstance(op, dict) else None
+        item = found.get(key) if is_id(key) else None
+
+        if kind not in BATCH_OPS:
+            error = "opération inconnue"
+        elif item is None:
+            error = "tâche introuvable"
+        elif item[0] in deleted:
+            error = "tâche déjà supprimée"
+        else:
+            key, t = item
+            if kind == "toggle":
+                current = done_state.get(key, bool(t.get("done")))
+                new = bool(op["done"]) if "done" in op else not current
+                done_state[key] = new
+                store_ops.append({"op": "toggle", "id": key, "done": new})
+            elif kind == "edit":
+                title = op.get("title")
+                if not isinstance(title, str) or not title.strip():
+                    error = "titre vide"
+                else:
+                    store_ops.append({"op": "edit", "id": key, "title": title.strip()})
+            elif kind == "move":
+                pos = op.get("pos")
+                if isinstance(pos, bool) or not isinstance(pos, (int, float)):
+                    error = "position invalide"
+                else:
+                    store_ops.append({"op": "move", "id": key, "pos": pos})
+            elif kind == "delete":
+                deleted.add(key)
+                store_ops.append({"op": "delete", "id": key})
+
+        results.append({"index": k, "ok": error is None, "error": error})
+
+    if any(not r["ok"] for r in results):
+        return None, results
+    return store_ops, results
@@ -0,0 +1,249 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# Benchmarks des routes Flask et des fonctions load/save du CLI sur des
+# jeux de données synthétiques (tasks.json, plan.json, contenu.json, backups/).
+#   python bench.py --sizes 100,1000,10000 --out bench.json
+# Chaque taille tourne dans un processus séparé (dossier temporaire, import
+# neuf de app.py). Résultat : percentiles de latence, débit, pic mémoire et
+# octets écrits par opération, en JSON pour comparer les commits entre eux ;
+# plus la taille et le temps d'écriture / lecture de tasks.json dans chaque format.
+
+WORDS = ["client", "avis", "google", "rdv", "offre", "story", "coupe", "relance", "salon", "créneau", "été", "tâche"]
+
+MAX_BACKUPS = 200
+
+
+def make_tasks(size, rng):
+    return [
+        {"id": k + 1, "title": " ".join(rng.choice(WORDS) for _ in range(3)) + f" {k}", "done": rng.random() < 0.3, "pos": (k + 1) * 1024}
+        for k in range(size)
+    ]
+
+
+def make_plan(size, rng):
+    days = []
+    for d in range(max(1, size // 3)):
+        items = [
+            {"id": f"d{d + 1}_{k}", "pillar": "Acquisition", "title": f"Action {k} [VILLE]", "duration_min": 10,
+             "script": "Bonjour 👋 voici le lien : [LIEN]. Offre : [OFFRE]. Contact : [téléphone/DM]", "done": rng.random() < 0.5}
+            for k in range(3)
+        ]
+        days.append({"day": d + 1, "items": items})
+    return {"sector": "coiffeur", "week": 1, "days": days}
+
+
+def make_contenu(size):
+    days = []
+    for d in range(max(1, size // 3)):
+        days.append({
+            "day": d + 1,
+            "reel": {"hook": "Dispo à [VILLE] ?", "script": "Plan 1 ... [OFFRE]", "shots": ["Avant", "Après"], "cta": "DM"},
+            "post": {"title": "Dispos ✅", "caption": "Réservez : [téléphone/DM]", "visual": "Photo"},
+            "story": {"slides": ["Slide 1 [VILLE]", "Slide 2 [LIEN]"]},
+        })
+    return {"sector": "coiffeur", "week": 1, "days": days}
+
+
+def generate(directory, size, seed=1):
+    from backups import BackupStore
+
+    rng = random.Random(seed)
+    tasks = make_tasks(size, rng)
+    (directory / "tasks.json").write_text(json.dumps(tasks, ensure_ascii=False), encoding="utf-8")
+    (directory / "plan.json").write_text(json.dumps(make_plan(size, rng), ensure_ascii=False), encoding="utf-8")
+    (directory / "contenu.json").write_text(json.dumps(make_contenu(size), ensure_ascii=False), encoding="utf-8")
+    (directory / "salon.json").write_text(json.dumps({"ville": "Namur", "lien_avis_google": "https://g.page/x", "telephone": "04"}), encoding="utf-8")
+
+    store = BackupStore(directory / "backups", keep=MAX_BACKUPS)
+    for k in range(min(size, MAX_BACKUPS)):
+        store.add(json.dumps(tasks[: 1 + k % 50], ensure_ascii=False).encode("utf-8"))
+    return tasks
+
+
+def written_bytes():
+    # octets passés à write() par le processus (Linux)
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def percentile(values, p):
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def measure(fn, repeat):
+    # un premier appel sous tracemalloc pour le pic mémoire, puis les mesures de temps
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    before = written_bytes()
+    times = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    after = written_bytes()
+
+    ms = [t * 1000 for t in times]
+    return {
+        "n": repeat,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p90_ms": round(percentile(ms, 90), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "ops_per_s": round(repeat / total, 1) if total else None,
+        "peak_kb": round(peak / 1024, 1),
+        "bytes_written_per_op": (after - before) // repeat if before is not None and after is not None else None,
+    }
+
+
+def bench_formats(tasks, repeat):
+    # encodage / décodage de la liste des tâches dans chaque format de fichier
+    from storage import FORMATS, encode, decode
+
+    results = {}
+    for fmt in FORMATS:
+        raw = encode(tasks, fmt)
+        results[fmt] = {
+            "bytes": len(raw),
+            "dump": measure(lambda: encode(tasks, fmt), repeat),
+            "parse": measure(lambda: decode(raw), repeat),
+        }
+    return results
+
+
+def run_size(size, repeat, backend, out):
+    directory = Path(tempfile.mkdtemp(prefix=f"bench-{size}-"))
+    tasks = generate(directory, size)
+    os.chdir(directory)
+    (directory / "config.json").write_text(json.dumps({"storage": backend, "keep_backups": MAX_BACKUPS}), encoding="utf-8")
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+    import app as A
+    import tasks as cli
+    cli.open_tenant()
+
+    A.app.template_folder = str(Path(__file__).resolve().parent / "templates")
+    client = A.app.test_client()
+    rng = random.Random(2)
+    ids = [t["id"] for t in tasks]
+    todo = [t["id"] for t in tasks if not t["done"]] or ids
+    heavy = max(3, repeat // 10)
+
+    def get(url):
+        def call():
+            r = client.get(url)
+            r.get_data()
+            assert r.status_code == 200, (url, r.status_code)
+        return call
+
+    def post(make_url, data=None):
+        def call():
+            r = client.post(make_url(), data=data or {})
+            assert r.status_code in (200, 302), (r.status_code,)
+        return call
+
+    results = {}
+    results["GET /"] = measure(get("/"), repeat)
+    results["GET /?q="] = measure(get("/?q=client av"), repeat)
+    results["POST /add"] = measure(post(lambda: "/add", {"title": "nouvelle tâche bench"}), repeat)
+    results["POST /toggle"] = measure(post(lambda: f"/toggle/{rng.choice(ids)}"), repeat)
+    results["POST /up"] = measure(post(lambda: f"/up/{rng.choice(todo)}"), repeat)
+    results["GET /export.csv"] = measure(get("/export.csv"), heavy)
+    results["GET /plan"] = measure(get("/plan"), repeat)
+    results["GET /today"] = measure(get("/today"), repeat)
+    results["GET /backups"] = measure(get("/backups"), repeat)
+    results["cli load_tasks"] = measure(lambda: cli.load_tasks(), heavy)
+    results["cli save_tasks"] = measure(lambda: cli.save_tasks(cli.load_tasks()), heavy)
+    # en dernier : la restauration remplace la liste par un petit backup
+    results["POST /restore"] = measure(post(lambda: f"/restore/{rng.choice(A.BACKUPS.list()[:10])['name']}"), heavy)
+
+    try:
+        import resource
+        max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        max_rss_kb = None
+    formats = bench_formats(tasks, heavy)
+    out.put({"size": size, "max_rss_kb": max_rss_kb, "routes": results, "formats": formats})
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks des routes et du CLI")
+    parser.add_argument("--sizes", default="100,1000,10000", help="tailles séparées par des virgules (jusqu'à 1000000)")
+    parser.add_argument("--repeat", type=int, default=50, help="appels par route (les routes lourdes en font 10 fois moins)")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--out", default="bench.json", help="fichier JSON de résultats")
+    args = parser.parse_args()
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "repeat": args.repeat,
+        "sizes": [],
+    }
+    ctx = multiprocessing.get_context("spawn")
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        out = ctx.Queue()
+        proc = ctx.Process(target=run_size, args=(size, args.repeat, args.backend, out))
+        proc.start()
+        result = None
+        while result is None:
+            try:
+                result = out.get(timeout=1)
+            except queue.Empty:
+                if not proc.is_alive():
+                    break
+        proc.join()
+        if result is None:
+            print(f"❌ {size} tâches : le processus de mesure a échoué")
+            continue
+        report["sizes"].append(result)
+        print(f"— {size} tâches (RSS max {result['max_rss_kb']} Ko)")
+        for route, r in result["routes"].items():
+            print(f"  {route:<18} p50 {r['p50_ms']:>9} ms  p99 {r['p99_ms']:>9} ms  {r['ops_per_s']:>8} op/s  "
+                  f"pic {r['peak_kb']:>9} Ko  écrit {r['bytes_written_per_op']} o/op")
+        for fmt, r in result["formats"].items():
+            print(f"  format {fmt:<11} {r['bytes']:>10} o  dump p50 {r['dump']['p50_ms']:>9} ms  "
+                  f"parse p50 {r['parse']['p50_ms']:>9} ms")
+
+    Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"✅ résultats : {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import struct
+
+# Encodage binaire des fichiers de données (format "binary" de config.json).
+# Mêmes types que JSON, sans pickle ni marshal :
+#   en-tête MAGIC, puis une valeur = 1 octet de type + contenu
+#   entiers en varint zigzag, textes préfixés par leur longueur (varint),
+#   listes et dicts préfixés par leur nombre d'éléments.
+# Les clés de dict ne sont écrites qu'une fois : ensuite une référence
+# (varint) vers la table des clés déjà vues ("title", "done", "pos"...).
+
+MAGIC = b"TBIN\x01"
+
+NONE, FALSE, TRUE, INT, FLOAT, STR, LIST, DICT = range(8)
+
+_double = struct.Struct("<d")
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def encode(value):
+    out = bytearray(MAGIC)
+    keys = {}
+
+    def write(v):
+        if v is None:
+            out.append(NONE)
+        elif v is True:
+            out.append(TRUE)
+        elif v is False:
+            out.append(FALSE)
+        elif isinstance(v, int):
+            out.append(INT)
+            _varint(out, v << 1 if v >= 0 else ((-v) << 1) - 1)
+        elif isinstance(v, float):
+            out.append(FLOAT)
+            out.extend(_double.pack(v))
+        elif isinstance(v, str):
+            raw = v.encode("utf-8")
+            out.append(STR)
+            _varint(out, len(raw))
+            out.extend(raw)
+        elif isinstance(v, (list, tuple)):
+            out.append(LIST)
+            _varint(out, len(v))
+            for item in v:
+                write(item)
+        elif isinstance(v, dict):
+            out.append(DICT)
+            _varint(out, len(v))
+            for k, item in v.items():
+                k = str(k)  # comme json.dumps
+                ref = keys.get(k)
+                if ref is None:
+                    keys[k] = len(keys) + 1
+                    raw = k.encode("utf-8")
+                    out.append(0)
+                    _varint(out, len(raw))
+                    out.extend(raw)
+                else:
+                    _varint(out, ref)
+                write(item)
+        else:
+            raise TypeError(f"type non sérialisable : {type(v).__name__}")
+
+    write(value)
+    return bytes(out)
+
+
+def decode(raw):
+    if not raw.startswith(MAGIC):
+        raise CodecError("en-tête binaire absent")
+    raw = bytes(raw)
+    pos = len(MAGIC)
+    keys = []
+
+    def varint():
+        # un octet dans la grande majorité des cas (petits entiers, longueurs)
+        nonlocal pos
+        b = raw[pos]
+        pos += 1
+        if b < 0x80:
+            return b
+        n, shift = b & 0x7F, 7
+        while True:
+            b = raw[pos]
+            pos += 1
+            n |= (b & 0x7F) << shift
+            if b < 0x80:
+                return n
+            shift += 7
+
+    def text():
+        nonlocal pos
+        n = varint()
+        start, pos = pos, pos + n
+        return raw[start:pos].decode("utf-8")
+
+    def read():
+        nonlocal pos
+        tag = raw[pos]
+        pos += 1
+        if tag == STR:
+            return text()
+        if tag == INT:
+            n = varint()
+            return n >> 1 if not n & 1 else -((n + 1) >> 1)
+        if tag == DICT:
+            d = {}
+            for _ in range(varint()):
+                ref = varint()
+                if ref:
+                    k = keys[ref - 1]
+                else:
+                    k = text()
+                    keys.append(k)
+                d[k] = read()
+            return d
+        if tag == LIST:
+            return [read() for _ in range(varint())]
+        if tag == TRUE:
+            return True
+        if tag == FALSE:
+            return False
+        if tag == NONE:
+            return None
+        if tag == FLOAT:
+            pos += 8
+            return _double.unpack_from(raw, pos - 8)[0]
+        raise CodecError(f"type inconnu : {tag}")
+
+    try:
+        value = read()
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise CodecError(f"fichier binaire abîmé ou tronqué ({e})") from None
+    if pos != len(raw):
+        raise CodecError("fichier binaire abîmé ou tronqué")
+    return value
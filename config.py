@@ -0,0 +1,32 @@
+import json
+from pathlib import Path
+
+CONFIG_FILE = Path("config.json")
+
+STORAGE_BACKENDS = ("json", "sqlite")
+
+DEFAULT_CONFIG = {
+    "keep_backups": 30,
+    "port": 5001,
+    "journal_compact_every": 200,
+    "storage": "json",
+    "page_size": 50,
+    "backup_delay": 2,
+    "slow_request_ms": 0,
+    "data_format": "json",
+    "tenant_mode": "",
+    "tenants_dir": "salons",
+    "tenant_memory_mb": 256,
+}
+
+
+def load_config():
+    if not CONFIG_FILE.exists():
+        return DEFAULT_CONFIG.copy()
+    try:
+        data = json.loads(CONFIG_FILE.read_text(encoding="utf-8"))
+        cfg = DEFAULT_CONFIG.copy()
+        cfg.update({k: data[k] for k in DEFAULT_CONFIG.keys() if k in data})
+        return cfg
+    except Exception:
+        return DEFAULT_CONFIG.copy()
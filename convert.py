@@ -0,0 +1,69 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from config import CONFIG_FILE, load_config
+from storage import FORMATS, set_format, read_bytes, decode, sniff_format, update_data
+from store import open_store
+
+# Conversion des fichiers de données entre les formats json / compact / binary.
+#   python convert.py --to binary          tous les fichiers + config.json
+#   python convert.py --to json plan.json  un seul fichier
+#   python convert.py --dump tasks.json    JSON lisible sur la sortie (débogage)
+#   python convert.py                      format et taille de chaque fichier
+# Relancez le serveur après une conversion.
+
+DATA_FILE = Path("tasks.json")
+DATA_FILES = [DATA_FILE, Path("plan.json"), Path("suivi.json"), Path("salon.json"), Path("contenu.json")]
+
+
+def convert(path, fmt):
+    before = read_bytes(path)
+    if before is None:
+        return None
+    if path == DATA_FILE:
+        # via le store : le journal est rejoué avant la réécriture
+        open_store(DATA_FILE, load_config()).compact(force=True)
+    else:
+        update_data(path, lambda data: None, fmt=fmt)
+    after = read_bytes(path)
+    return len(before), len(after)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversion des fichiers de données")
+    parser.add_argument("files", nargs="*", help="fichiers à traiter (défaut : tous les fichiers de données)")
+    parser.add_argument("--to", choices=FORMATS, help="format cible (enregistré dans config.json)")
+    parser.add_argument("--dump", action="store_true", help="affiche le contenu en JSON indenté")
+    args = parser.parse_args()
+    files = [Path(f) for f in args.files] or DATA_FILES
+
+    if args.dump:
+        for path in files:
+            raw = read_bytes(path)
+            if raw is None:
+                print(f"❌ {path} introuvable", file=sys.stderr)
+                return 1
+            print(json.dumps(decode(raw), ensure_ascii=False, indent=2))
+        return 0
+
+    if args.to:
+        set_format(args.to)
+        if not args.files:
+            update_data(CONFIG_FILE, lambda cfg: cfg.update(data_format=args.to), default=load_config, fmt="json")
+        for path in files:
+            sizes = convert(path, args.to)
+            if sizes:
+                print(f"✅ {path} : {sizes[0]} → {sizes[1]} octets ({args.to})")
+        return 0
+
+    for path in files:
+        raw = read_bytes(path)
+        if raw is not None:
+            print(f"{path} : {sniff_format(raw)}, {len(raw)} octets")
+    print(f"format configuré : {load_config().get('data_format', 'json')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import csv
+import io
+import json
+import zlib
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+    "json": "application/json; charset=utf-8",
+}
+
+CHUNK_ROWS = 500
+
+
+def _row(num, t):
+    return {"num": num, "title": t.get("title", ""), "done": t.get("done", False), "pos": t.get("pos", "")}
+
+
+def iter_csv(items):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["num", "title", "done", "pos"])
+    for num, (_, t) in enumerate(items, start=1):
+        writer.writerow([num, t.get("title", ""), t.get("done", False), t.get("pos", "")])
+        if num % CHUNK_ROWS == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    yield out.getvalue()
+
+
+def iter_ndjson(items):
+    lines = []
+    for num, (_, t) in enumerate(items, start=1):
+        lines.append(json.dumps(_row(num, t), ensure_ascii=False) + "\n")
+        if len(lines) == CHUNK_ROWS:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
+
+
+def iter_json(items):
+    yield "["
+    sep = "\n"
+    lines = []
+    for num, (_, t) in enumerate(items, start=1):
+        lines.append(sep + json.dumps(_row(num, t), ensure_ascii=False))
+        sep = ",\n"
+        if len(lines) == CHUNK_ROWS:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines) + "\n]\n"
+
+
+def iter_export(fmt, items):
+    # morceaux de texte ; rien n'est construit en entier en mémoire
+    if fmt == "csv":
+        return iter_csv(items)
+    if fmt == "ndjson":
+        return iter_ndjson(items)
+    return iter_json(items)
+
+
+def iter_gzip(chunks):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = en-tête gzip
+    for chunk in chunks:
+        data = z.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield z.flush()
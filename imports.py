@@ -0,0 +1,91 @@
+import csv
+import io
+import json
+
+from store import POS_GAP
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+TRUE_VALUES = {"1", "true", "vrai", "oui", "yes", "x", "✅"}
+
+MAX_REPORTED_ERRORS = 100
+
+
+def parse_done(value):
+    if isinstance(value, bool):
+        return value
+    if value is None:
+        return False
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def detect_format(filename, fmt=None):
+    fmt = (fmt or "").strip().lower()
+    if fmt in IMPORT_FORMATS:
+        return fmt
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def iter_csv_rows(text):
+    reader = csv.DictReader(text)
+    fields = [f.strip().lower() for f in (reader.fieldnames or [])]
+    if "title" not in fields and "titre" not in fields:
+        yield 1, None, "colonne 'title' manquante"
+        return
+    reader.fieldnames = fields
+    for row in reader:
+        title = (row.get("title") or row.get("titre") or "").strip()
+        if not title:
+            yield reader.line_num, None, "titre vide"
+            continue
+        yield reader.line_num, {"title": title, "done": parse_done(row.get("done"))}, None
+
+
+def iter_ndjson_rows(text):
+    for line_num, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield line_num, None, "JSON invalide"
+            continue
+        if not isinstance(obj, dict):
+            yield line_num, None, "objet JSON attendu"
+            continue
+        title = obj.get("title")
+        if not isinstance(title, str) or not title.strip():
+            yield line_num, None, "titre vide"
+            continue
+        yield line_num, {"title": title.strip(), "done": parse_done(obj.get("done"))}, None
+
+
+def read_import(stream, fmt):
+    # lit le fichier ligne par ligne ; positions relatives à la fin de la liste
+    # (POS_GAP, 2 * POS_GAP, ...), décalées par import_tasks sous le verrou
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    rows = iter_ndjson_rows(text) if fmt == "ndjson" else iter_csv_rows(text)
+
+    tasks = []
+    errors = []
+    error_count = 0
+    try:
+        for line_num, task, error in rows:
+            if error:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_num, "error": error})
+                continue
+            task["pos"] = POS_GAP * (len(tasks) + 1)
+            tasks.append(task)
+    except (UnicodeDecodeError, csv.Error) as e:
+        error_count += 1
+        errors.append({"line": None, "error": f"fichier illisible : {e}"})
+    finally:
+        text.detach()
+
+    return tasks, {"imported": len(tasks), "error_count": error_count, "errors": errors}
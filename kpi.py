@@ -0,0 +1,145 @@
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from metrics import span, count_read, count_written
+from storage import FileLock, read_data, write_data
+
+# Historique des indicateurs de /suivi : journal en ajout seul (kpi.log),
+# enregistrements de taille fixe = horodatage + semaine du suivi + totaux
+# (valeurs absolues) de cette semaine au moment de l'enregistrement.
+# Les cumuls par jour / semaine / mois sont tenus à jour au fil de l'eau
+# (kpi.rollup.json, avec la position déjà lue dans le journal) : une requête
+# sur une période ne parcourt que les cases de la période, pas les entrées.
+# Chaque semaine du suivi compte pour son dernier enregistrement de chaque
+# semaine du calendrier : une correction dans la même semaine remplace les
+# totaux précédents (retirés des cases de leur horodatage), un enregistrement
+# d'une semaine suivante s'ajoute. Les cases des semaines passées ne sont jamais
+# modifiées, et aucune valeur n'est négative.
+
+FIELDS = ("leads", "bookings", "noshow", "revenue", "reviews")
+
+GRAINS = ("day", "week", "month")
+
+# horodatage (secondes) + semaine du suivi + un entier par compteur
+RECORD = struct.Struct("<qq" + "q" * len(FIELDS))
+
+
+def bucket_keys(ts):
+    # cases d'un horodatage (heure locale) ; les clés se trient comme les dates
+    d = datetime.fromtimestamp(ts).date()
+    year, week, _ = d.isocalendar()
+    return {"day": d.isoformat(), "week": f"{year}-W{week:02d}", "month": d.strftime("%Y-%m")}
+
+
+def ratio(num, den):
+    return round(num / den, 4) if den else None
+
+
+def bucket_json(key, sums):
+    # sums = [leads, bookings, noshow, revenue, reviews, entrées]
+    b = dict(zip(FIELDS, sums))
+    b["key"] = key
+    b["entries"] = sums[len(FIELDS)]
+    b["conversion"] = ratio(b["bookings"], b["leads"])
+    b["noshow_ratio"] = ratio(b["noshow"], b["bookings"])
+    return b
+
+
+def empty_rollups():
+    # last : "semaine du suivi|semaine du calendrier" -> derniers totaux + horodatage
+    return {"offset": 0, "total": [0] * (len(FIELDS) + 1), "last": {}, "day": {}, "week": {}, "month": {}}
+
+
+class KpiLog:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.rollup_path = self.path.with_suffix(".rollup.json")
+        self._rollups = None
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return self.path.exists()
+
+    def append(self, week, values, ts=None):
+        # values : totaux de la semaine `week` du suivi (valeurs absolues)
+        row = [max(0, int(values.get(k, 0))) for k in FIELDS]
+        record = RECORD.pack(int(time.time() if ts is None else ts), int(week), *row)
+        with FileLock(self.path):
+            with open(self.path, "ab") as f:
+                # enregistrement incomplet en fin de fichier (arrêt brutal) : écarté
+                size = f.tell()
+                if size % RECORD.size:
+                    f.truncate(size - size % RECORD.size)
+                f.write(record)
+        count_written(self.path, RECORD.size)
+        return True
+
+    @span("kpi.rollups")
+    def rollups(self):
+        # cumuls à jour : seuls les enregistrements ajoutés depuis la dernière
+        # lecture sont repris, puis les cumuls sont réenregistrés
+        with self._lock:
+            r = self._rollups
+            if r is None:
+                r = read_data(self.rollup_path)
+                if not isinstance(r, dict) or set(r) != set(empty_rollups()):
+                    r = empty_rollups()
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            if r["offset"] > size:  # journal remplacé ou tronqué : on repart de zéro
+                r = empty_rollups()
+            size -= (size - r["offset"]) % RECORD.size
+            if size > r["offset"]:
+                with open(self.path, "rb") as f:
+                    f.seek(r["offset"])
+                    raw = f.read(size - r["offset"])
+                count_read(self.path, len(raw))
+                for ts, week, *row in RECORD.iter_unpack(raw):
+                    self._fold(r, ts, str(week), row)
+                r["offset"] = size
+                with FileLock(self.rollup_path):
+                    write_data(self.rollup_path, r)
+            self._rollups = r
+            return r
+
+    def _fold(self, r, ts, week, row):
+        # les totaux précédents de la semaine du suivi dans la même semaine du
+        # calendrier sont retirés de leurs cases, puis les nouveaux ajoutés
+        keys = bucket_keys(ts)
+        name = f"{week}|{keys['week']}"
+        prev = r["last"].get(name)
+        if prev is not None:
+            for grain, key in bucket_keys(prev[-1]).items():
+                sums = r[grain][key]
+                for k, v in enumerate(prev[:-1]):
+                    sums[k] -= v
+            for k, v in enumerate(prev[:-1]):
+                r["total"][k] -= v
+        for grain, key in keys.items():
+            sums = r[grain].get(key)
+            if sums is None:
+                sums = r[grain][key] = [0] * (len(FIELDS) + 1)
+            for k, v in enumerate(row):
+                sums[k] += v
+            sums[-1] += 1
+        for k, v in enumerate(row):
+            r["total"][k] += v
+        r["total"][-1] += 1
+        r["last"][name] = row + [ts]
+
+    def series(self, grain, start=None, end=None, last=None):
+        # cases de `grain` entre les clés start et end (incluses), triées ;
+        # last=n : seulement les n dernières
+        buckets = self.rollups()[grain]
+        keys = sorted(k for k in buckets if (start is None or k >= start) and (end is None or k <= end))
+        if last is not None:
+            keys = keys[-last:] if last > 0 else []
+        return [bucket_json(k, buckets[k]) for k in keys]
+
+    def total(self):
+        return bucket_json("total", self.rollups()["total"])
@@ -0,0 +1,154 @@
+import functools
+import threading
+import time
+from pathlib import Path
+
+# buckets (secondes) des histogrammes de latence
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = "taches_"
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for k, le in enumerate(BUCKETS):
+            if value <= le:
+                self.counts[k] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    # compteurs et histogrammes en mémoire, exportés au format texte Prometheus.
+    # Les spans de la requête en cours sont gardés par thread pour le journal
+    # des requêtes lentes.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+        self._local = threading.local()
+
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = Histogram()
+            h.observe(value)
+
+    def start_request(self):
+        self._local.spans = []
+
+    def end_request(self):
+        spans = getattr(self._local, "spans", None) or []
+        self._local.spans = None
+        return spans
+
+    def record_span(self, name, seconds):
+        self.observe("span_seconds", seconds, span=name)
+        spans = getattr(self._local, "spans", None)
+        if spans is not None:
+            spans.append((name, seconds))
+
+    def render(self, gauges=()):
+        # gauges : [(nom, type, aide, {labels}, valeur)] calculées au moment de l'export
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {k: (list(h.counts), h.sum, h.count) for k, h in self._histograms.items()}
+
+        seen = set()
+
+        def header(name, kind, text):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {PREFIX}{name} {text}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter", self._help.get(name, ("", name))[1])
+            lines.append(f"{PREFIX}{name}{format_labels(dict(labels))} {value}")
+
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            header(name, "histogram", self._help.get(name, ("", name))[1])
+            labels = dict(labels)
+            cumulative = 0
+            for le, c in zip(BUCKETS, counts):
+                cumulative += c
+                lines.append(f"{PREFIX}{name}_bucket{format_labels(dict(labels, le=le))} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{format_labels(dict(labels, le='+Inf'))} {count}")
+            lines.append(f"{PREFIX}{name}_sum{format_labels(labels)} {round(total, 6)}")
+            lines.append(f"{PREFIX}{name}_count{format_labels(labels)} {count}")
+
+        # regroupées par nom : le format exige les échantillons d'une métrique à la suite
+        for name, kind, text, labels, value in sorted(gauges, key=lambda g: g[0]):
+            header(name, kind, text)
+            lines.append(f"{PREFIX}{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def file_label(path):
+    # étiquette bornée : les objets de backups/objects/ partagent la même
+    path = Path(path)
+    return "backups/objects" if path.parent.name == "objects" else path.name
+
+
+METRICS = Metrics()
+METRICS.describe("requests_total", "counter", "Requêtes HTTP par route, méthode et statut")
+METRICS.describe("request_duration_seconds", "histogram", "Durée des requêtes HTTP par route")
+METRICS.describe("span_seconds", "histogram", "Durée des étapes internes (stockage, backups, rendu)")
+METRICS.describe("bytes_read_total", "counter", "Octets lus par fichier")
+METRICS.describe("bytes_written_total", "counter", "Octets écrits par fichier")
+
+
+class span:
+    # with span("store.load"): ...  ou  @span("store.load") sur une fonction
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        METRICS.record_span(self.name, time.perf_counter() - self._start)
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(self.name):
+                return fn(*args, **kwargs)
+        return inner
+
+
+def count_read(path, size):
+    METRICS.inc("bytes_read_total", size, file=file_label(path))
+
+
+def count_written(path, size):
+    METRICS.inc("bytes_written_total", size, file=file_label(path))
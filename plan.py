@@ -0,0 +1,149 @@
+import json
+import threading
+from pathlib import Path
+from storage import FileLock, file_signature, write_data, read_bytes, decode, check_etag
+from metrics import span
+
+EMPTY_PLAN = {"sector": "coiffeur", "week": 1, "days": []}
+
+
+class Plan:
+    # programme parsé une fois : index id -> (jour, action), compteurs
+    # fait / total par jour et au total, jour actuel tenu à jour à chaque bascule
+    def __init__(self, data):
+        self.data = data
+        self.days = data.get("days", [])
+        self._items = {}
+        self._counts = []  # [fait, total] par jour, dans l'ordre du programme
+        self._day_index = {}
+        self.done = 0
+        self.total = 0
+        for n, d in enumerate(self.days):
+            self._day_index[d.get("day")] = n
+            items = d.get("items", [])
+            done = sum(1 for it in items if it.get("done"))
+            self._counts.append([done, len(items)])
+            self.done += done
+            self.total += len(items)
+            for it in items:
+                self._items[it.get("id")] = (n, it)
+        self._current = self._first_open(0)
+
+    def _first_open(self, start):
+        # premier jour (à partir de start) qui a encore une action à faire
+        for n in range(start, len(self.days)):
+            done, total = self._counts[n]
+            if total and done < total:
+                return n
+        return None
+
+    def progress(self):
+        pct = int((self.done / self.total) * 100) if self.total else 0
+        return {"done": self.done, "total": self.total, "pct": pct}
+
+    def current_day(self):
+        return self.days[self._current].get("day") if self._current is not None else None
+
+    def active_index(self):
+        # jour actuel, ou le dernier jour quand tout est fait
+        if self._current is not None:
+            return self._current
+        return len(self.days) - 1 if self.days else None
+
+    def active_day(self):
+        n = self.active_index()
+        return self.days[n] if n is not None else None
+
+    def day(self, number):
+        n = self._day_index.get(number)
+        return self.days[n] if n is not None else None
+
+    def item(self, item_id):
+        found = self._items.get(item_id)
+        return found[1] if found else None
+
+    def set_done(self, item_id, done):
+        found = self._items.get(item_id)
+        if found is None:
+            return False
+        n, it = found
+        delta = int(bool(done)) - int(bool(it.get("done")))
+        it["done"] = bool(done)
+        if delta:
+            self._counts[n][0] += delta
+            self.done += delta
+            if delta < 0 and (self._current is None or n < self._current):
+                self._current = n
+            elif delta > 0 and n == self._current:
+                self._current = self._first_open(n)
+        return True
+
+
+class PlanStore:
+    # garde le Plan en mémoire tant que plan.json n'a pas changé (mtime, taille, inode).
+    # Les bascules relisent le fichier sous verrou avant d'écrire : pas de mise
+    # à jour perdue entre plusieurs processus.
+    def __init__(self, path):
+        self.path = Path(path)
+        self._plan = None
+        self._sig = None
+        self.version = 0  # change à chaque relecture ou écriture (clé des caches de rendu)
+        self._lock = threading.RLock()
+        self._flock = FileLock(self.path)
+
+    def _signature(self):
+        return file_signature(self.path)
+
+    def load(self):
+        with self._lock:
+            sig = self._signature()
+            if self._plan is None or sig != self._sig:
+                with span("plan.load"):
+                    data = decode(read_bytes(self.path)) if sig else json.loads(json.dumps(EMPTY_PLAN))
+                    self._plan = Plan(data)
+                self._sig = sig
+                self.version += 1
+            return self._plan
+
+    @span("plan.save")
+    def save(self, data=None):
+        with self._lock, self._flock:
+            if data is not None:
+                self._plan = Plan(data)
+            plan = self._plan or self.load()
+            write_data(self.path, plan.data)
+            self._sig = self._signature()
+            self.version += 1
+
+    def toggle(self, item_id):
+        with self._lock, self._flock:
+            plan = self.load()
+            it = plan.item(item_id)
+            if it is None:
+                return False
+            plan.set_done(item_id, not bool(it.get("done")))
+            self.save()
+            return True
+
+    def update_item(self, item_id, done, expect=None):
+        # renvoie l'action modifiée (None si elle n'existe pas) ;
+        # expect : ETags acceptés (If-Match), PreconditionFailed si elle a changé
+        with self._lock, self._flock:
+            plan = self.load()
+            it = plan.item(item_id)
+            if it is None:
+                return None
+            check_etag(item_id, it, expect)
+            plan.set_done(item_id, done)
+            self.save()
+            return it
+
+    def reset_day(self, number):
+        with self._lock, self._flock:
+            plan = self.load()
+            d = plan.day(number)
+            if d is None:
+                return
+            for it in d.get("items", []):
+                plan.set_done(it.get("id"), False)
+            self.save()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from metrics import span
+
+RENDER_CACHE_SIZE = 16
+
+
+def placeholder_values(salon):
+    # [VILLE], [LIEN], [téléphone/DM], [OFFRE] + champs personnalisés
+    # du salon ("placeholders": {"[PRENOM]": "Julie", ...})
+    values = {
+        "[VILLE]": salon.get("ville", "") or "[VILLE]",
+        "[LIEN]": salon.get("lien_avis_google", "") or "[LIEN]",
+        "[téléphone/DM]": salon.get("telephone", "") or salon.get("cta", "DM RDV"),
+        "[OFFRE]": "Offre du moment",
+    }
+    for key, value in (salon.get("placeholders") or {}).items():
+        key = str(key).strip()
+        if key:
+            values[key if key.startswith("[") else f"[{key}]"] = str(value)
+    return values
+
+
+@lru_cache(maxsize=8)
+def _compile(items):
+    values = dict(items)
+    # les plus longs d'abord : un seul passage, sans conflit entre préfixes
+    pattern = re.compile("|".join(re.escape(k) for k in sorted(values, key=len, reverse=True)))
+
+    def substitute(text):
+        if not isinstance(text, str) or "[" not in text:
+            return text
+        return pattern.sub(lambda m: values[m.group(0)], text)
+
+    return substitute
+
+
+def compile_salon(salon):
+    return _compile(tuple(sorted(placeholder_values(salon).items())))
+
+
+def salon_key(salon):
+    return hashlib.sha1(json.dumps(salon, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+@span("render.plan")
+def render_plan(plan, sub):
+    # copie du programme avec les textes remplis ; l'original reste intact
+    days = [
+        dict(d, items=[dict(it, title=sub(it.get("title", "")), script=sub(it.get("script", ""))) for it in d.get("items", [])])
+        for d in plan.get("days", [])
+    ]
+    return dict(plan, days=days)
+
+
+@span("render.contenu")
+def render_contenu(data, sub):
+    days = []
+    for d in data.get("days", []):
+        reel, post, story = d.get("reel", {}), d.get("post", {}), d.get("story", {})
+        days.append(dict(
+            d,
+            reel=dict(reel, hook=sub(reel.get("hook", "")), script=sub(reel.get("script", ""))),
+            post=dict(post, title=sub(post.get("title", "")), caption=sub(post.get("caption", "")), visual=sub(post.get("visual", ""))),
+            story=dict(story, slides=[sub(s) for s in story.get("slides", [])]),
+        ))
+    return dict(data, days=days)
+
+
+class RenderCache:
+    # documents déjà remplis, clé = (nom, hash du salon, signature du fichier source) ;
+    # les moins récemment utilisés sont évincés au-delà de `size`
+    def __init__(self, size=RENDER_CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,89 @@
+import re
+import unicodedata
+from bisect import bisect_left, insort
+
+WORD_RE = re.compile(r"\w+")
+
+
+def fold(text):
+    # minuscules sans accents : "Tâche" -> "tache"
+    text = text or ""
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return set(WORD_RE.findall(fold(text)))
+
+
+class SearchIndex:
+    # index inversé mot -> clés des tâches, avec recherche par préfixe
+    # sur le vocabulaire trié. Mis à jour à chaque ajout / édition / suppression.
+    def __init__(self):
+        self.postings = {}
+        self.tokens = {}
+        self.vocab = []
+
+    def add(self, key, title):
+        words = tokenize(title)
+        self.tokens[key] = words
+        for w in words:
+            keys = self.postings.get(w)
+            if keys is None:
+                keys = self.postings[w] = set()
+                insort(self.vocab, w)
+            keys.add(key)
+
+    def add_many(self, items):
+        # construction initiale : trie le vocabulaire une seule fois
+        postings = self.postings
+        for key, title in items:
+            words = tokenize(title)
+            self.tokens[key] = words
+            for w in words:
+                keys = postings.get(w)
+                if keys is None:
+                    keys = postings[w] = set()
+                keys.add(key)
+        self.vocab = sorted(postings)
+
+    def remove(self, key):
+        for w in self.tokens.pop(key, ()):
+            keys = self.postings.get(w)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self.postings[w]
+                i = bisect_left(self.vocab, w)
+                if i < len(self.vocab) and self.vocab[i] == w:
+                    del self.vocab[i]
+
+    def update(self, key, title):
+        self.remove(key)
+        self.add(key, title)
+
+    def _prefix(self, prefix):
+        keys = set()
+        i = bisect_left(self.vocab, prefix)
+        while i < len(self.vocab) and self.vocab[i].startswith(prefix):
+            keys |= self.postings[self.vocab[i]]
+            i += 1
+        return keys
+
+    def match(self, q):
+        # tous les mots de la recherche doivent préfixer un mot du titre
+        words = sorted(tokenize(q), key=len, reverse=True)
+        if not words:
+            return set()
+        result = self._prefix(words[0])
+        for w in words[1:]:
+            if not result:
+                break
+            result &= self._prefix(w)
+        return result
+
+    def __len__(self):
+        return len(self.tokens)
@@ -0,0 +1,244 @@
+import codecs
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from metrics import count_read, count_written
+import codec
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité aux threads du processus
+    fcntl = None
+
+UPDATE_RETRIES = 5
+
+# format des fichiers de données (tasks.json, plan.json, suivi, salon, backups) :
+#   "json"    indenté, lisible (historique)
+#   "compact" JSON sans espaces
+#   "binary"  encodage de codec.py
+# À la lecture le format est reconnu tout seul : changer de format ne demande
+# aucune conversion, chaque fichier passe au nouveau format à sa prochaine écriture.
+FORMATS = ("json", "compact", "binary")
+
+DATA_FORMAT = "json"
+
+
+def set_format(fmt):
+    global DATA_FORMAT
+    if fmt not in FORMATS:
+        raise ValueError(f"format inconnu : {fmt} (attendu : {', '.join(FORMATS)})")
+    DATA_FORMAT = fmt
+
+
+class FileLock:
+    # verrou exclusif partagé entre processus (flock sur <fichier>.lock) et
+    # entre threads ; réentrant : un même thread peut l'imbriquer sans se bloquer
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __new__(cls, path):
+        key = os.path.abspath(path)
+        with cls._registry_lock:
+            lock = cls._registry.get(key)
+            if lock is None:
+                lock = super().__new__(cls)
+                lock.path = Path(str(path) + ".lock")
+                lock._rlock = threading.RLock()
+                lock._depth = 0
+                lock._fd = None
+                cls._registry[key] = lock
+            return lock
+
+    def __init__(self, path):
+        pass
+
+    def __enter__(self):
+        self._rlock.acquire()
+        if self._depth == 0:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl:
+                    fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                self._rlock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._rlock.release()
+
+
+class PreconditionFailed(Exception):
+    # If-Match : la ressource a changé (ou disparu) depuis que le client l'a lue
+    def __init__(self, key, current):
+        super().__init__(key)
+        self.key = key
+        self.current = current
+
+
+def content_etag(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def check_etag(key, current, accepted, etag=content_etag):
+    # accepted : ETags acceptés ({"*"} = n'importe quelle version existante),
+    # None = pas de précondition
+    if accepted is None:
+        return
+    if current is None or ("*" not in accepted and etag(current) not in accepted):
+        raise PreconditionFailed(key, current)
+
+
+def file_signature(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def atomic_write(path, data):
+    # fichier temporaire dans le même dossier + fsync + os.replace :
+    # un lecteur voit l'ancien contenu ou le nouveau, jamais un fichier à moitié écrit
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd, tmp = tempfile.mkstemp(dir=path.parent or ".", prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        count_written(path, len(data))
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def encode(data, fmt=None):
+    fmt = fmt or DATA_FORMAT
+    if fmt == "binary":
+        return codec.encode(data)
+    if fmt == "compact":
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def decode(raw):
+    if raw.startswith(codec.MAGIC):
+        return codec.decode(raw)
+    return json.loads(raw)
+
+
+def iter_list(f, chunk_size=1 << 16):
+    # éléments d'une liste (tasks.json, backup) un par un, depuis un fichier
+    # binaire ouvert (gzip, BytesIO...) : le JSON est lu par morceaux, sans
+    # charger tout le document ; le format binaire est décodé d'un bloc
+    head = f.read(len(codec.MAGIC))
+    if head == codec.MAGIC:
+        yield from codec.decode(head + f.read())
+        return
+    text = codecs.getincrementaldecoder("utf-8")()
+    decoder = json.JSONDecoder()
+    buf, pos, started, eof = text.decode(head), 0, False, False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("liste JSON attendue")
+                started, pos = True, pos + 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                # une valeur qui touche la fin du tampon peut être coupée : on relit
+                if end < len(buf) or eof:
+                    yield value
+                    pos = end
+                    continue
+        elif eof:
+            raise ValueError("liste JSON tronquée")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + text.decode(chunk, final=eof), 0
+
+
+def sniff_format(raw):
+    if raw.startswith(codec.MAGIC):
+        return "binary"
+    return "json" if b"\n" in raw.strip() else "compact"
+
+
+def write_json(path, data, indent=2):
+    # toujours du JSON (config.json, exports lisibles)
+    atomic_write(path, json.dumps(data, ensure_ascii=False, indent=indent))
+
+
+def write_data(path, data, fmt=None):
+    atomic_write(path, encode(data, fmt))
+
+
+def read_bytes(path):
+    # None si le fichier n'existe pas ; compte les octets lus (/metrics)
+    try:
+        data = Path(path).read_bytes()
+    except FileNotFoundError:
+        return None
+    count_read(path, len(data))
+    return data
+
+
+def _parse(raw, default):
+    if raw is None:
+        return default() if callable(default) else default
+    return decode(raw)
+
+
+def read_data(path, default=None):
+    # JSON ou binaire, reconnu à l'en-tête
+    return _parse(read_bytes(path), default)
+
+
+def update_data(path, mutate, default=None, fmt=None):
+    # lecture-modification-écriture optimiste : on lit et on modifie sans
+    # verrou, puis on n'écrit (sous verrou) que si le fichier n'a pas changé
+    # entre-temps ; sinon on recommence. En dernier recours tout se fait sous verrou.
+    # `default` : valeur (ou fonction) utilisée si le fichier n'existe pas encore.
+    for _ in range(UPDATE_RETRIES):
+        raw = read_bytes(path)
+        data = _parse(raw, default)
+        result = mutate(data)
+        with FileLock(path):
+            if read_bytes(path) == raw:
+                write_data(path, data, fmt)
+                return result
+    with FileLock(path):
+        data = read_data(path, default)
+        result = mutate(data)
+        write_data(path, data, fmt)
+        return result
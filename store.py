@@ -0,0 +1,848 @@
+import json
+import os
+import sqlite3
+import threading
+import base64
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from search import SearchIndex
+from table import TaskTable, Rows
+from storage import FileLock, atomic_write, write_data, read_bytes, decode, content_etag, check_etag
+from metrics import span, count_written
+
+
+# Interface commune aux deux backends (TaskStore / SqliteTaskStore) :
+#   load() / save(tasks)      -> liste complète (CLI, export, restauration)
+#   apply(ops, expect)        -> mutations par id ; renvoie les ids des tâches ajoutées.
+#                                expect {id: ETags acceptés} : PreconditionFailed si une
+#                                tâche a changé depuis sa lecture (If-Match de l'API)
+#   get(id) / get_many(ids)   -> accès direct par id
+#   ordered() / search(q)     -> séquence de (id, tâche) triée par (done, pos)
+#                                (tâche = dict, ou TaskView en lecture seule pour TaskStore)
+#   neighbour(id, pas)        -> tâche à faire voisine (pour monter/descendre)
+#   page(limit, after, before, q) -> une page (pagination par curseur sur (done, pos))
+#   rank(id, tâche)           -> numéro affiché dans la liste complète
+#   iter_items(q, done)       -> générateur (id, tâche) pour les exports
+#   import_tasks(tasks)       -> ajout en masse en fin de liste (pos relatives, décalées
+#                                après max_pos sous le verrou) : une seule écriture, un seul backup
+#   counts() / max_pos()       -> max_pos est suivi, pas recalculé à chaque ajout
+#   compact(force) / invalidate() / stats()
+#   version() / mtime()       -> jeton qui change à chaque écriture + date de dernière
+#                                modification, sans charger les tâches (ETag / 304)
+
+
+# écart entre deux positions consécutives : laisse de la place pour
+# insérer entre deux tâches sans renuméroter le reste de la liste
+POS_GAP = 1024
+
+# taille max d'une fenêtre renumérotée quand il n'y a plus de place
+REBALANCE_MAX = 64
+
+
+def sort_key(key, t):
+    return (bool(t.get("done", False)), t.get("pos", 10**9), key)
+
+
+def task_etag(t):
+    # même valeur pour un dict et une TaskView
+    return content_etag({"id": t.get("id"), "title": t.get("title", ""), "done": bool(t.get("done")), "pos": t.get("pos")})
+
+
+def ensure_ids(tasks, next_id=1):
+    # migration : donne un id (et une position) aux tâches qui n'en ont pas,
+    # dans l'ordre de la liste ; renvoie le prochain id libre
+    next_id = max([next_id] + [t["id"] + 1 for t in tasks if isinstance(t.get("id"), int)])
+    pos = max((t.get("pos", 0) for t in tasks if "pos" in t), default=0)
+    for t in tasks:
+        if not isinstance(t.get("id"), int):
+            t["id"] = next_id
+            next_id += 1
+        if "pos" not in t:
+            pos += POS_GAP
+            t["pos"] = pos
+    return next_id
+
+
+def encode_cursor(key, t):
+    raw = json.dumps([bool(t.get("done", False)), t.get("pos", 10**9), key])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        done, pos, key = json.loads(raw)
+        return (bool(done), pos, key)
+    except (ValueError, TypeError):
+        return None
+
+
+def item_key(item):
+    return sort_key(*item)
+
+
+def page_items(items, limit, after=None, before=None):
+    # items (id, tâche) triés par (done, pos, id) ; renvoie (page, index de début)
+    try:
+        if before is not None:
+            end = bisect_left(items, before, key=item_key)
+            start = max(0, end - limit)
+        else:
+            start = bisect_right(items, after, key=item_key) if after is not None else 0
+    except TypeError:
+        start = 0
+    return items[start:start + limit], start
+
+
+def make_page(items, start, total, done):
+    return {
+        "items": items,
+        "start": start,
+        "total": total,
+        "done": done,
+        "prev": encode_cursor(*items[0]) if items and start > 0 else None,
+        "next": encode_cursor(*items[-1]) if items and start + len(items) < total else None,
+    }
+
+
+def apply_op(tasks, op):
+    # applique une opération du journal (tasks : TaskTable)
+    kind = op.get("op")
+    if kind == "add":
+        tasks.add(op["task"])
+        return True
+    key = op.get("id")
+    if key not in tasks:
+        return False
+    if kind == "toggle":
+        tasks.set(key, done=bool(op.get("done")))
+    elif kind == "edit":
+        tasks.set(key, title=op.get("title", ""))
+    elif kind == "delete":
+        tasks.delete(key)
+    elif kind == "move":
+        tasks.set(key, pos=op.get("pos"))
+    else:
+        return False
+    return True
+
+
+def apply_index_op(tasks, op):
+    # anciens journaux (avant les ids) : "i" = position dans la liste
+    kind = op.get("op")
+    i = op.get("i")
+    if kind == "add":
+        tasks.append(dict(op["task"]))
+        return
+    if not isinstance(i, int) or not (0 <= i < len(tasks)):
+        return
+    if kind == "toggle":
+        tasks[i]["done"] = bool(op.get("done"))
+    elif kind == "edit":
+        tasks[i]["title"] = op.get("title", "")
+    elif kind == "delete":
+        tasks.pop(i)
+    elif kind == "move":
+        tasks[i]["pos"] = op.get("pos")
+
+
+def append_ops(store, tasks):
+    # ops "add" à la suite de la dernière tâche ; pour apply_batch, qui lit
+    # max_pos sous le même verrou que l'écriture (pas de positions en double)
+    pos = store.max_pos()
+    return [{"op": "add", "task": dict(t, pos=pos + POS_GAP * (k + 1))} for k, t in enumerate(tasks)]
+
+
+def toggle_ops(store, task_id):
+    # bascule de l'état lu sous le verrou d'apply_batch : deux bascules
+    # simultanées ne s'annulent pas en une seule
+    t = store.get(task_id)
+    return [{"op": "toggle", "id": task_id, "done": not bool(t.get("done"))}] if t is not None else []
+
+
+def move_ops(store, task_id, before_id=None):
+    # ops pour placer la tâche à faire task_id juste avant before_id
+    # (None = en fin de liste). En général une seule op ; s'il n'y a plus
+    # de place entre les deux voisins, seules les tâches suivantes les
+    # plus proches sont renumérotées (fenêtre locale).
+    t = store.get(task_id)
+    if t is None or t.get("done", False) or before_id == task_id:
+        return []
+
+    if before_id is None:
+        if store.neighbour(task_id, 1) is None:
+            return []
+        return [{"op": "move", "id": task_id, "pos": store.max_pos() + POS_GAP}]
+
+    target = store.get(before_id)
+    if target is None or target.get("done", False):
+        return []
+    prev = store.neighbour(before_id, -1)
+    if prev is not None and prev[0] == task_id:
+        return []
+    if prev is None:
+        return [{"op": "move", "id": task_id, "pos": target.get("pos", 0) - POS_GAP}]
+
+    low = prev[1].get("pos", 0)
+    window = [task_id]
+    cur = (before_id, target)
+    while True:
+        if cur is None:
+            step = POS_GAP
+        else:
+            step = (cur[1].get("pos", 0) - low) // (len(window) + 1)
+        if step >= 1 and (len(window) == 1 or step >= POS_GAP // 4 or len(window) >= REBALANCE_MAX):
+            break
+        if cur[0] != task_id:
+            window.append(cur[0])
+        cur = store.neighbour(cur[0], 1)
+
+    return [{"op": "move", "id": key, "pos": low + step * (n + 1)} for n, key in enumerate(window)]
+
+
+class TaskStore:
+    # garde les tâches en mémoire (TaskTable, voir table.py) et ne relit les fichiers
+    # que si leur signature (mtime, taille, inode) a changé.
+    # Les modifications sont ajoutées à un journal (une ligne par requête)
+    # puis compactées dans tasks.json toutes les `compact_every` entrées.
+    def __init__(self, path, compact_every=200, on_snapshot=None):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(".journal")
+        self.compact_every = compact_every
+        self.on_snapshot = on_snapshot
+        self.hits = 0
+        self.misses = 0
+        self.journal_entries = 0
+        self.compactions = 0
+        self._tasks = None
+        self._next_id = 1
+        self._sig = None
+        self._reset_derived()
+        self._lock = threading.RLock()
+        self._flock = FileLock(self.path)  # écritures / relectures entre processus
+
+    def _reset_derived(self):
+        # index de recherche, reconstruit à la demande ; l'ordre et les
+        # compteurs sont tenus à jour par la table elle-même
+        self._search = None
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _signature(self):
+        return (self._stat(self.path), self._stat(self.journal_path))
+
+    def _base(self):
+        # identifie le snapshot sur lequel le journal s'appuie
+        st = self._stat(self.path)
+        return [st[0], st[1]] if st else None
+
+    def _map(self):
+        with self._lock:
+            if self._tasks is not None and self._signature() == self._sig:
+                self.hits += 1
+                return self._tasks
+            with self._flock:
+                # relecture sous verrou : aucun autre processus n'est en train
+                # d'ajouter au journal ou de compacter
+                return self._reload()
+
+    @span("store.reload")
+    def _reload(self):
+        sig = self._signature()
+        if self._tasks is not None and sig == self._sig:
+            self.hits += 1
+            return self._tasks
+
+        self.misses += 1
+        snapshot = decode(read_bytes(self.path)) if sig[0] is not None else []
+        header, entries = self._read_journal()
+        ops = [op for entry in entries for op in entry.get("ops", [])]
+        self._reset_derived()
+
+        if any(not isinstance(t.get("id"), int) for t in snapshot) or any("i" in op for op in ops):
+            # fichiers d'avant les ids : on rejoue à l'ancienne puis on migre
+            for op in ops:
+                apply_index_op(snapshot, op)
+            self._next_id = ensure_ids(snapshot)
+            self._tasks = TaskTable(snapshot)
+            self._write_snapshot(self._tasks)
+            return self._tasks
+
+        tasks = TaskTable(snapshot)
+        del snapshot
+        for op in ops:
+            apply_op(tasks, op)
+        self._tasks = tasks
+        self._next_id = max(
+            [header.get("next_id", 1)]
+            + [k + 1 for k in tasks]
+            + [op["task"]["id"] + 1 for op in ops if op.get("op") == "add"]
+        )
+        if header:
+            self.journal_entries = len(entries)
+        else:
+            self._reset_journal()
+        self._sig = self._signature()
+        return self._tasks
+
+    def load(self):
+        # copies indépendantes (dicts) de toutes les tâches
+        return list(self._map().dicts())
+
+    def _read_journal(self):
+        # renvoie (en-tête, entrées valides) ; coupe une dernière ligne abîmée
+        self.journal_entries = 0
+        if not self.journal_path.exists():
+            return {}, []
+
+        raw = read_bytes(self.journal_path)
+        offset = 0
+        header = None
+        entries = []
+        for line in raw.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break  # dernière ligne coupée (crash pendant l'écriture)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if header is None:
+                header = entry
+                if header.get("base") != self._base():
+                    # tasks.json a été réécrit sans passer par le journal
+                    return {}, []
+            else:
+                entries.append(entry)
+            offset += len(line)
+
+        if header is None:
+            return {}, []
+        if offset < len(raw):
+            os.truncate(self.journal_path, offset)
+        return header, entries
+
+    def _reset_journal(self):
+        header = json.dumps({"base": self._base(), "next_id": self._next_id}) + "\n"
+        atomic_write(self.journal_path, header)
+        self.journal_entries = 0
+
+    @span("store.apply")
+    def apply(self, ops, expect=None):
+        with self._lock, self._flock:
+            tasks = self._map()  # reprend les écritures des autres processus
+            for key, accepted in (expect or {}).items():
+                check_etag(key, tasks.get(key), accepted, task_etag)
+            added = []
+            for op in ops:
+                if op.get("op") == "add" and not isinstance(op["task"].get("id"), int):
+                    op["task"] = dict(op["task"], id=self._next_id)
+                    self._next_id += 1
+                if op.get("op") == "add":
+                    added.append(op["task"]["id"])
+                self._apply_indexed(tasks, op)
+            line = json.dumps({"ops": ops}, ensure_ascii=False) + "\n"
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(line)
+            count_written(self.journal_path, len(line.encode("utf-8")))
+            self.journal_entries += 1
+            self._sig = self._signature()
+            if self.journal_entries >= self.compact_every:
+                self.compact()
+            return added
+
+    def _apply_indexed(self, tasks, op):
+        # garde l'index de recherche à jour sans le reconstruire
+        if not apply_op(tasks, op):
+            return
+        kind = op.get("op")
+        key = op["task"]["id"] if kind == "add" else op.get("id")
+        if self._search is not None:
+            if kind == "delete":
+                self._search.remove(key)
+            elif kind in ("add", "edit"):
+                self._search.update(key, tasks.field(key, "title"))
+
+    def apply_batch(self, build):
+        # build(store) -> (ops ou None, résultat) : validation et écriture sous
+        # le même verrou, sur un seul état de la liste. Renvoie (ops, résultat, ids ajoutés)
+        with self._lock, self._flock:
+            ops, result = build(self)
+            added = self.apply(ops) if ops else []
+            return ops, result, added
+
+    @span("store.import")
+    def import_tasks(self, new_tasks):
+        with self._lock, self._flock:
+            tasks = self._map()
+            base = tasks.max_pos()
+            for t in new_tasks:
+                t = dict(t, id=self._next_id, pos=base + t.get("pos", 0))
+                self._next_id += 1
+                self._apply_indexed(tasks, {"op": "add", "task": t})
+            self.compact(force=True)
+
+    @span("store.compact")
+    def compact(self, force=False):
+        with self._lock, self._flock:
+            if self._tasks is None and not force:
+                return
+            self._map()
+            if not force and self.journal_entries == 0 and self.path.exists():
+                return
+            self._write_snapshot(self._tasks)
+            self.compactions += 1
+            if self.on_snapshot:
+                self.on_snapshot()
+
+    @span("store.save")
+    def save(self, tasks):
+        # remplace toute la liste (restauration, CLI)
+        with self._lock, self._flock:
+            self._next_id = ensure_ids(tasks, self._next_id)
+            self._tasks = TaskTable(tasks)
+            self._reset_derived()
+            self._write_snapshot(self._tasks)
+
+    def _write_snapshot(self, tasks):
+        write_data(self.path, list(tasks.dicts()))
+        self._reset_journal()
+        self._sig = self._signature()
+
+    def invalidate(self):
+        with self._lock:
+            self._tasks = None
+            self._sig = None
+
+    def get(self, key):
+        return self._map().get(key)
+
+    def get_many(self, keys):
+        tasks = self._map()
+        return {k: (k, tasks.get(k)) for k in keys if k in tasks}
+
+    def ordered(self):
+        # ordre (done, pos) tenu à jour par la table ; copie des ids (un memcpy) :
+        # une mutation pendant qu'on parcourt la liste (export en streaming, CLI)
+        # ne décale pas le parcours
+        with self._lock:
+            tasks = self._map()
+            return Rows(tasks, array("q", tasks.order()))
+
+    def iter_items(self, q=None, done=None):
+        items = self.search(q) if q else self.ordered()
+        for key, t in items:
+            if done is None or bool(t.get("done")) == done:
+                yield key, t
+
+    @span("store.search")
+    def search(self, q):
+        with self._lock:
+            tasks = self._map()
+            if self._search is None:
+                self._search = SearchIndex()
+                self._search.add_many(zip(tasks.ids, tasks.titles))
+            keys = sorted(self._search.match(q), key=tasks.sort_key)
+        return Rows(tasks, keys)
+
+    @span("store.page")
+    def page(self, limit, after=None, before=None, q=None):
+        # tranche et compteurs pris sous le verrou : l'ordre vivant de la table
+        # ne bouge pas pendant la recherche du curseur
+        with self._lock:
+            tasks = self._map()
+            if q:
+                items = self.search(q)
+                done = items.done_count()
+            else:
+                items = Rows(tasks, tasks.order())
+                done = tasks.done_total
+            rows, start = page_items(items, limit, after, before)
+            return make_page(rows, start, len(items), done)
+
+    def rank(self, key, t):
+        with self._lock:
+            tasks = self._map()
+            return bisect_left(tasks.order(), sort_key(key, t), key=tasks.sort_key) + 1
+
+    def neighbour(self, key, step):
+        with self._lock:
+            tasks = self._map()
+            if key not in tasks or tasks.field(key, "done"):
+                return None
+            order = tasks.order()
+            k = bisect_left(order, tasks.sort_key(key), key=tasks.sort_key) + step
+            if 0 <= k < len(order) and not tasks.field(order[k], "done"):
+                return order[k], tasks.get(order[k])
+            return None
+
+    def counts(self):
+        with self._lock:
+            tasks = self._map()
+            return len(tasks), tasks.done_total
+
+    def version(self):
+        return self._signature()
+
+    def mtime(self):
+        return max((st[0] / 1e9 for st in self._signature() if st), default=None)
+
+    def max_pos(self):
+        with self._lock:
+            return self._map().max_pos()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "backend": "json",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "cached": self._tasks is not None,
+                "size": len(self._tasks) if self._tasks is not None else 0,
+                "journal_entries": self.journal_entries,
+                "compactions": self.compactions,
+            }
+
+
+class SqliteTaskStore:
+    # tâches dans une base SQLite (WAL) avec un index sur (done, pos) :
+    # les routes ne lisent que les lignes qu'elles affichent ou modifient.
+    # La clé d'une tâche est sa colonne id. Toutes les `compact_every` mutations,
+    # la liste est exportée dans tasks.json (pour les backups et la restauration).
+    def __init__(self, path, json_path=None, compact_every=200, on_snapshot=None):
+        self.path = Path(path)
+        self.json_path = Path(json_path) if json_path else None
+        self.compact_every = compact_every
+        self.on_snapshot = on_snapshot
+        self.mutations = 0
+        self.compactions = 0
+        self._search = None
+        self._search_version = None
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._init_db()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        # sous verrou : plusieurs processus peuvent démarrer en même temps
+        with FileLock(self.path):
+            self._create_schema()
+
+    def _create_schema(self):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "title TEXT NOT NULL, done INTEGER NOT NULL DEFAULT 0, pos INTEGER NOT NULL)"
+            )
+            columns = [r["name"] for r in conn.execute("PRAGMA table_info(tasks)")]
+            if "id" not in columns:
+                # base créée avant les ids : le rowid devient l'id
+                conn.execute(
+                    "CREATE TABLE tasks_v2 (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "title TEXT NOT NULL, done INTEGER NOT NULL DEFAULT 0, pos INTEGER NOT NULL)"
+                )
+                conn.execute("INSERT INTO tasks_v2 (id, title, done, pos) SELECT rowid, title, done, pos FROM tasks")
+                conn.execute("DROP TABLE tasks")
+                conn.execute("ALTER TABLE tasks_v2 RENAME TO tasks")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_done_pos ON tasks (done, pos)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_pos ON tasks (pos)")  # MAX(pos) sans scan
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0')")
+        self._migrate(conn)
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'total'").fetchone() is None:
+            with conn:
+                self._recount(conn)
+
+    def _migrate(self, conn):
+        # import unique de tasks.json (journal compris) au premier lancement
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+            return
+        tasks = []
+        if self.json_path:
+            tasks = TaskStore(self.json_path).load()
+        with conn:
+            self._insert(conn, tasks)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('migrated', ?)", (str(len(tasks)),))
+            self._recount(conn)
+
+    def _recount(self, conn):
+        # agrégats total / faits tenus à jour dans la table meta
+        total, done = conn.execute("SELECT COUNT(*), COALESCE(SUM(done), 0) FROM tasks").fetchone()
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [("total", total), ("done", done)])
+
+    def _add_counts(self, conn, total, done):
+        if total:
+            conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key = 'total'", (total,))
+        if done:
+            conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key = 'done'", (done,))
+
+    def _insert(self, conn, tasks):
+        conn.executemany(
+            "INSERT INTO tasks (id, title, done, pos) VALUES (?, ?, ?, ?)",
+            ((t.get("id"), t.get("title", ""), int(bool(t.get("done"))), t.get("pos", 10**9)) for t in tasks),
+        )
+
+    def _row(self, r):
+        return r["id"], {"id": r["id"], "title": r["title"], "done": bool(r["done"]), "pos": r["pos"]}
+
+    def _select(self, where="", params=(), limit="", desc=False):
+        order = "done DESC, pos DESC, id DESC" if desc else "done, pos, id"
+        sql = f"SELECT id, title, done, pos FROM tasks {where} ORDER BY {order} {limit}"
+        return [self._row(r) for r in self._conn().execute(sql, params)]
+
+    def load(self):
+        return [t for _, t in self._select()]
+
+    def _version(self, conn):
+        return int(conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+
+    def _bump(self, conn):
+        # compteur de version : détecte les écritures d'un autre processus
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        return self._version(conn)
+
+    @span("store.save")
+    def save(self, tasks):
+        with self._lock:
+            ensure_ids(tasks)
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM tasks")
+                self._insert(conn, tasks)
+                self._recount(conn)
+                self._bump(conn)
+            self._search = None
+
+    @span("store.apply")
+    def apply(self, ops, expect=None):
+        with self._lock:
+            conn = self._conn()
+            changes = []
+            added = []
+            with conn:
+                if expect:
+                    # vérifié dans la transaction d'écriture : aucun autre processus entre les deux
+                    conn.execute("BEGIN IMMEDIATE")
+                    for key, accepted in expect.items():
+                        check_etag(key, self.get(key), accepted, task_etag)
+                for op in ops:
+                    kind, key = op.get("op"), op.get("id")
+                    if kind == "add":
+                        t = op["task"]
+                        cur = conn.execute(
+                            "INSERT INTO tasks (id, title, done, pos) VALUES (?, ?, ?, ?)",
+                            (t.get("id"), t.get("title", ""), int(bool(t.get("done"))), t.get("pos", 10**9)),
+                        )
+                        added.append(cur.lastrowid)
+                        changes.append((cur.lastrowid, t.get("title", "")))
+                        self._add_counts(conn, 1, int(bool(t.get("done"))))
+                    elif kind == "toggle":
+                        row = conn.execute("SELECT done FROM tasks WHERE id = ?", (key,)).fetchone()
+                        if row is not None:
+                            new = int(bool(op.get("done")))
+                            conn.execute("UPDATE tasks SET done = ? WHERE id = ?", (new, key))
+                            self._add_counts(conn, 0, new - row["done"])
+                    elif kind == "edit":
+                        conn.execute("UPDATE tasks SET title = ? WHERE id = ?", (op.get("title", ""), key))
+                        changes.append((key, op.get("title", "")))
+                    elif kind == "delete":
+                        row = conn.execute("SELECT done FROM tasks WHERE id = ?", (key,)).fetchone()
+                        if row is not None:
+                            conn.execute("DELETE FROM tasks WHERE id = ?", (key,))
+                            self._add_counts(conn, -1, -row["done"])
+                            changes.append((key, None))
+                    elif kind == "move":
+                        conn.execute("UPDATE tasks SET pos = ? WHERE id = ?", (op.get("pos"), key))
+                version = self._bump(conn)
+
+            if self._search is not None and self._search_version == version - 1:
+                for key, title in changes:
+                    if title is None:
+                        self._search.remove(key)
+                    else:
+                        self._search.update(key, title)
+                self._search_version = version
+            self.mutations += 1
+            if self.mutations >= self.compact_every:
+                self.compact()
+            return added
+
+    def apply_batch(self, build):
+        # même contrat que TaskStore.apply_batch ; la transaction d'écriture
+        # commence avant la validation (aucun autre processus entre les deux)
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                ops, result = build(self)
+                added = self.apply(ops) if ops else []
+            return ops, result, added
+
+    @span("store.import")
+    def import_tasks(self, new_tasks):
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                base = self.max_pos()
+                self._insert(conn, [dict(t, id=None, pos=base + t.get("pos", 0)) for t in new_tasks])
+                self._add_counts(conn, len(new_tasks), sum(1 for t in new_tasks if t.get("done")))
+                self._bump(conn)
+            self._search = None
+            self.compact(force=True)
+
+    @span("store.compact")
+    def compact(self, force=False):
+        with self._lock:
+            if not force and self.mutations == 0:
+                return
+            if self.json_path:
+                write_data(self.json_path, self.load())
+            self.mutations = 0
+            self.compactions += 1
+            if self.on_snapshot:
+                self.on_snapshot()
+
+    def invalidate(self):
+        pass
+
+    def ordered(self):
+        return self._select()
+
+    def get(self, key):
+        rows = self._select("WHERE id = ?", (key,))
+        return rows[0][1] if rows else None
+
+    def get_many(self, keys):
+        keys = [k for k in keys if isinstance(k, int)]
+        found = {}
+        for k in range(0, len(keys), 500):
+            chunk = keys[k:k + 500]
+            marks = ",".join("?" * len(chunk))
+            found.update((key, (key, t)) for key, t in self._select(f"WHERE id IN ({marks})", chunk))
+        return found
+
+    def iter_items(self, q=None, done=None):
+        if q:
+            for key, t in self.search(q):
+                if done is None or t["done"] == done:
+                    yield key, t
+            return
+        where, params = ("WHERE done = ?", (int(done),)) if done is not None else ("", ())
+        cur = self._conn().execute(f"SELECT id, title, done, pos FROM tasks {where} ORDER BY done, pos, id", params)
+        while True:
+            rows = cur.fetchmany(500)
+            if not rows:
+                break
+            for r in rows:
+                yield self._row(r)
+
+    @span("store.search")
+    def search(self, q):
+        with self._lock:
+            conn = self._conn()
+            version = self._version(conn)
+            if self._search is None or self._search_version != version:
+                self._search = SearchIndex()
+                self._search.add_many(conn.execute("SELECT id, title FROM tasks"))
+                self._search_version = version
+            keys = list(self._search.match(q))
+
+        # ne relit que les lignes trouvées
+        items = list(self.get_many(keys).values())
+        items.sort(key=lambda it: sort_key(*it))
+        return items
+
+    @span("store.page")
+    def page(self, limit, after=None, before=None, q=None):
+        if q:
+            items = self.search(q)
+            rows, start = page_items(items, limit, after, before)
+            return make_page(rows, start, len(items), sum(1 for _, t in items if t["done"]))
+
+        total, done = self.counts()
+        try:
+            if before is not None:
+                rows = self._select("WHERE (done, pos, id) < (?, ?, ?)", before, f"LIMIT {int(limit)}", desc=True)
+                rows.reverse()
+                if len(rows) < limit:
+                    rows = self._select(limit=f"LIMIT {int(limit)}")
+            elif after is not None:
+                rows = self._select("WHERE (done, pos, id) > (?, ?, ?)", after, f"LIMIT {int(limit)}")
+            else:
+                rows = self._select(limit=f"LIMIT {int(limit)}")
+        except sqlite3.Error:
+            rows = self._select(limit=f"LIMIT {int(limit)}")
+        start = self.rank(*rows[0]) - 1 if rows else 0
+        return make_page(rows, start, total, done)
+
+    def rank(self, key, t):
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM tasks WHERE (done, pos, id) < (?, ?, ?)",
+            (int(bool(t.get("done"))), t.get("pos"), key),
+        ).fetchone()
+        return row[0] + 1
+
+    def neighbour(self, key, step):
+        r = self._conn().execute("SELECT pos FROM tasks WHERE id = ? AND done = 0", (key,)).fetchone()
+        if r is None:
+            return None
+        if step < 0:
+            sql = "SELECT id, title, done, pos FROM tasks WHERE done = 0 AND (pos, id) < (?, ?) ORDER BY pos DESC, id DESC LIMIT 1"
+        else:
+            sql = "SELECT id, title, done, pos FROM tasks WHERE done = 0 AND (pos, id) > (?, ?) ORDER BY pos, id LIMIT 1"
+        row = self._conn().execute(sql, (r["pos"], key)).fetchone()
+        return self._row(row) if row else None
+
+    def counts(self):
+        rows = dict(self._conn().execute("SELECT key, value FROM meta WHERE key IN ('total', 'done')").fetchall())
+        return int(rows.get("total", 0)), int(rows.get("done", 0))
+
+    def version(self):
+        return self._version(self._conn())
+
+    def mtime(self):
+        paths = (self.path, self.path.with_name(self.path.name + "-wal"))
+        return max((os.stat(p).st_mtime for p in paths if p.exists()), default=None)
+
+    def max_pos(self):
+        return self._conn().execute("SELECT COALESCE(MAX(pos), 0) FROM tasks").fetchone()[0]
+
+    def stats(self):
+        total, done = self.counts()
+        return {
+            "backend": "sqlite",
+            "size": total,
+            "done": done,
+            "mutations": self.mutations,
+            "compactions": self.compactions,
+        }
+
+
+def open_store(data_file, cfg, on_snapshot=None):
+    # choisit le backend selon config.json ("storage": "json" ou "sqlite")
+    data_file = Path(data_file)
+    compact_every = max(1, int(cfg.get("journal_compact_every", 200)))
+    if cfg.get("storage") == "sqlite":
+        return SqliteTaskStore(data_file.with_suffix(".db"), json_path=data_file,
+                               compact_every=compact_every, on_snapshot=on_snapshot)
+    return TaskStore(data_file, compact_every=compact_every, on_snapshot=on_snapshot)
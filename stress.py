@@ -0,0 +1,83 @@
+import json
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+from pathlib import Path
+
+from store import TaskStore, SqliteTaskStore, append_ops, toggle_ops
+from storage import update_data, read_data
+
+# Test de charge des écritures concurrentes : plusieurs processus ajoutent
+# des tâches en fin de liste, basculent une même tâche partagée et incrémentent
+# un compteur JSON en même temps, puis on vérifie qu'aucune écriture n'a été
+# perdue (ni bascule annulée, ni position en double).
+#   python stress.py [processus] [écritures par processus] [json|sqlite]
+
+
+def open_backend(directory, backend):
+    if backend == "sqlite":
+        return SqliteTaskStore(directory / "tasks.db", json_path=directory / "tasks.json", compact_every=25)
+    return TaskStore(directory / "tasks.json", compact_every=25)
+
+
+def worker(directory, backend, n, count, shared):
+    store = open_backend(directory, backend)
+    counter = directory / "counter.json"
+    for k in range(count):
+        store.apply_batch(lambda s: (append_ops(s, [{"title": f"w{n}-{k}", "done": False}]), None))
+        store.apply_batch(lambda s: (toggle_ops(s, shared), None))
+        update_data(counter, lambda data: data.update(value=data["value"] + 1), default=lambda: {"value": 0})
+    store.compact()
+
+
+def run(workers=4, count=200, backend="json"):
+    directory = Path(tempfile.mkdtemp(prefix="stress-"))
+    seed = open_backend(directory, backend)
+    shared = seed.apply([{"op": "add", "task": {"title": "partagée", "done": False, "pos": 0}}])[0]
+    seed.compact()
+    start = time.perf_counter()
+    procs = [Process(target=worker, args=(directory, backend, n, count, shared)) for n in range(workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    tasks = open_backend(directory, backend).load()
+    titles = {t["title"] for t in tasks}
+    ids = [t["id"] for t in tasks]
+    positions = [t["pos"] for t in tasks]
+    flips = {t["id"]: t["done"] for t in tasks}.get(shared)
+    expected = {f"w{n}-{k}" for n in range(workers) for k in range(count)}
+    counter = read_data(directory / "counter.json", {"value": 0})["value"]
+
+    lost_tasks = len(expected - titles)
+    lost_counter = workers * count - counter
+    duplicate_ids = len(ids) - len(set(ids))
+    duplicate_positions = len(positions) - len(set(positions))
+    lost_toggles = flips != bool(workers * count % 2)
+    print(json.dumps({
+        "backend": backend,
+        "workers": workers,
+        "writes": workers * count,
+        "seconds": round(elapsed, 2),
+        "tasks": len(tasks),
+        "lost_tasks": lost_tasks,
+        "duplicate_ids": duplicate_ids,
+        "duplicate_positions": duplicate_positions,
+        "lost_toggles": lost_toggles,
+        "counter": counter,
+        "lost_counter_updates": lost_counter,
+    }, indent=2))
+    return (lost_tasks == 0 and lost_counter == 0 and duplicate_ids == 0 and duplicate_positions == 0
+            and not lost_toggles and len(tasks) == workers * count + 1)
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    backend = sys.argv[3] if len(sys.argv) > 3 else "json"
+    ok = run(workers, count, backend)
+    print("✅ aucune écriture perdue" if ok else "❌ écritures perdues")
+    sys.exit(0 if ok else 1)
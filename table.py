@@ -0,0 +1,269 @@
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+
+# Table des tâches en colonnes, pour les très longues listes : au lieu d'un
+# dict Python par tâche, une ligne = une case dans chaque colonne
+#   ids / pos : array("q")   done : bytearray (un octet par tâche)
+#   titles : liste de textes internés (les titres répétés ne coûtent qu'une fois)
+# Les champs inhabituels (autres que id/title/done/pos) vont dans `extra`.
+# L'ordre d'affichage (done, pos, id) est un array d'ids tenu à jour à chaque
+# mutation (bisect + insertion), sans liste de tuples par requête.
+# Templates, exports et CLI reçoivent des TaskView : vues en lecture seule,
+# utilisables comme des dicts (task.title, t.get("done"), dict(t)).
+
+MISSING_POS = 10**9  # même valeur par défaut que store.sort_key
+
+FIELDS = frozenset(("id", "title", "done", "pos"))
+
+
+def _int_pos(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return MISSING_POS
+    return int(value)
+
+
+class TaskView(Mapping):
+    __slots__ = ("_table", "id")
+
+    def __init__(self, table, key):
+        self._table = table
+        self.id = key
+
+    def __getitem__(self, name):
+        return self._table.field(self.id, name)
+
+    def __iter__(self):
+        yield from ("id", "title", "done", "pos")
+        yield from self._table.extra.get(self.id, ())
+
+    def __len__(self):
+        return 4 + len(self._table.extra.get(self.id, ()))
+
+    def __repr__(self):
+        return f"TaskView({dict(self)!r})"
+
+
+class Rows(Sequence):
+    # séquence paresseuse de (id, TaskView) sur une liste d'ids déjà triée
+    __slots__ = ("table", "ids")
+
+    def __init__(self, table, ids):
+        self.table = table
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [(key, TaskView(self.table, key)) for key in self.ids[k]]
+        key = self.ids[k]
+        return key, TaskView(self.table, key)
+
+    def __iter__(self):
+        table = self.table
+        for key in self.ids:
+            if key in table:  # supprimée depuis
+                yield key, TaskView(table, key)
+
+    def done_count(self):
+        done, row = self.table.done, self.table.row
+        return sum(done[row(k)] for k in self.ids)
+
+
+class TaskTable:
+    def __init__(self, tasks=()):
+        self.ids = array("q")
+        self.pos = array("q")
+        self.done = bytearray()
+        self.titles = []
+        self.extra = {}
+        self.done_total = 0
+        self._index = array("q")  # id -> ligne, -1 si absent
+        self._sparse = {}         # ids trop grands pour _index
+        self._order = None
+        self._max_pos = None
+        self._load(list(tasks))
+
+    def _load(self, tasks):
+        # chargement en bloc (relecture de tasks.json) : colonne par colonne
+        ids = [t["id"] for t in tasks]
+        if len(set(ids)) != len(ids):
+            for t in tasks:  # ids en double : le dernier gagne, comme dans un dict
+                self.add(t)
+            return
+        intern = sys.intern
+        self.ids = array("q", ids)
+        self.pos = array("q", [_int_pos(t.get("pos")) for t in tasks])
+        self.done = bytearray(1 if t.get("done") else 0 for t in tasks)
+        self.titles = [intern(str(t.get("title", ""))) for t in tasks]
+        for t in tasks:
+            if t.keys() - FIELDS:
+                self.extra[t["id"]] = {k: v for k, v in t.items() if k not in FIELDS}
+        self.done_total = self.done.count(1)
+        top = max(ids, default=-1)
+        if min(ids, default=0) >= 0 and top <= 2 * len(ids) + 1024:
+            index = self._index = array("q", [-1]) * (top + 1)
+            for r, key in enumerate(ids):
+                index[key] = r
+        else:
+            for r, key in enumerate(ids):
+                self._set_row(key, r)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, key):
+        return self.row(key) is not None
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def row(self, key):
+        if isinstance(key, int) and 0 <= key < len(self._index):
+            r = self._index[key]
+            return r if r >= 0 else None
+        return self._sparse.get(key)
+
+    def _set_row(self, key, r):
+        # r = -1 : id retiré. _sparse ne contient que des ids hors de _index
+        # (row() ne le lit que pour ceux-là)
+        self._sparse.pop(key, None)
+        if 0 <= key < len(self._index):
+            self._index[key] = r
+        elif r < 0:
+            return
+        elif 0 <= key <= 2 * len(self._index) + 1024:
+            self._index.extend([-1] * (key + 1 - len(self._index)))
+            # les ids rangés dans _sparse qui tiennent maintenant dans _index y passent
+            for other in [k for k in self._sparse if 0 <= k < len(self._index)]:
+                self._index[other] = self._sparse.pop(other)
+            self._index[key] = r
+        else:
+            self._sparse[key] = r
+
+    def get(self, key):
+        return TaskView(self, key) if self.row(key) is not None else None
+
+    def field(self, key, name):
+        r = self.row(key)
+        if r is None:
+            raise KeyError(key)
+        if name == "title":
+            return self.titles[r]
+        if name == "done":
+            return bool(self.done[r])
+        if name == "pos":
+            return self.pos[r]
+        if name == "id":
+            return key
+        extra = self.extra.get(key)
+        if extra is None or name not in extra:
+            raise KeyError(name)
+        return extra[name]
+
+    def sort_key(self, key):
+        r = self.row(key)
+        return (self.done[r], self.pos[r], key)
+
+    def to_dict(self, key):
+        r = self.row(key)
+        t = {"id": key, "title": self.titles[r], "done": bool(self.done[r]), "pos": self.pos[r]}
+        if key in self.extra:
+            t.update(self.extra[key])
+        return t
+
+    def dicts(self):
+        for key in self.ids:
+            yield self.to_dict(key)
+
+    # --- mutations ---
+
+    def add(self, t):
+        key = t["id"]
+        if key in self:
+            self.delete(key)
+        r = len(self.ids)
+        self.ids.append(key)
+        self.pos.append(_int_pos(t.get("pos")))
+        self.done.append(1 if t.get("done") else 0)
+        self.titles.append(sys.intern(str(t.get("title", ""))))
+        other = {k: v for k, v in t.items() if k not in FIELDS}
+        if other:
+            self.extra[key] = other
+        self._set_row(key, r)
+        self.done_total += self.done[r]
+        if self._max_pos is not None:
+            self._max_pos = max(self._max_pos, self.pos[r])
+        self._insert_order(key)
+
+    def set(self, key, **fields):
+        r = self.row(key)
+        if "title" in fields:
+            self.titles[r] = sys.intern(str(fields["title"]))
+        if "done" not in fields and "pos" not in fields:
+            return
+        self._remove_order(key)
+        if "done" in fields:
+            done = 1 if fields["done"] else 0
+            self.done_total += done - self.done[r]
+            self.done[r] = done
+        if "pos" in fields:
+            old, new = self.pos[r], _int_pos(fields["pos"])
+            self.pos[r] = new
+            if self._max_pos is not None:
+                if new >= self._max_pos:
+                    self._max_pos = new
+                elif old >= self._max_pos:
+                    self._max_pos = None  # le max a baissé : recalculé au prochain appel
+        self._insert_order(key)
+
+    def delete(self, key):
+        r = self.row(key)
+        self._remove_order(key)
+        self.done_total -= self.done[r]
+        if self._max_pos is not None and self.pos[r] >= self._max_pos:
+            self._max_pos = None
+        # la dernière ligne prend la place de la ligne supprimée
+        last = len(self.ids) - 1
+        if r != last:
+            moved = self.ids[last]
+            self.ids[r] = moved
+            self.pos[r] = self.pos[last]
+            self.done[r] = self.done[last]
+            self.titles[r] = self.titles[last]
+            self._set_row(moved, r)
+        self.ids.pop()
+        self.pos.pop()
+        self.done.pop()
+        self.titles.pop()
+        self.extra.pop(key, None)
+        self._set_row(key, -1)
+
+    # --- ordre et agrégats ---
+
+    def order(self):
+        # ids triés par (done, pos, id)
+        if self._order is None:
+            self._order = array("q", sorted(self.ids, key=self.sort_key))
+        return self._order
+
+    def _remove_order(self, key):
+        if self._order is not None:
+            k = bisect_left(self._order, self.sort_key(key), key=self.sort_key)
+            if k < len(self._order) and self._order[k] == key:
+                del self._order[k]
+            else:
+                self._order = None
+
+    def _insert_order(self, key):
+        if self._order is not None:
+            target = self.sort_key(key)
+            self._order.insert(bisect_left(self._order, target, key=self.sort_key), key)
+
+    def max_pos(self):
+        if self._max_pos is None:
+            self._max_pos = max(self.pos, default=0)
+        return self._max_pos
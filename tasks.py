@@ -1,152 +1,342 @@
+import argparse
 import json
+import sys
 from pathlib import Path
+from store import POS_GAP, append_ops, toggle_ops
+from batch import build_batch
+from config import load_config
+from imports import detect_format, read_import
+from storage import set_format
+from tenants import Tenant
+
+# Liste de tâches en ligne de commande, sur le même store que l'application web
+# (journal + verrou partagé, compaction, backups) : on peut la lancer pendant
+# que le serveur tourne.
+#   python tasks.py                          menu interactif
+#   python tasks.py add "Acheter du pain"    une ou plusieurs tâches
+#   python tasks.py toggle 3 7 | delete 4 | edit 3 "Nouveau titre"
+#   python tasks.py list [-q texte] [--done 0|1]
+#   python tasks.py stats
+#   python tasks.py batch < ops.txt          une commande par ligne (ou une ligne JSON {"op": ...})
+#   python tasks.py import fichier.csv
+# --json : sortie JSON ; --salon NOM : salon de tenants_dir (mode multi-salons).
+# Toutes les opérations d'un appel sont validées ensemble puis appliquées en
+# une seule écriture ; si l'une est invalide, rien n'est appliqué (code 1).
+
+set_format(load_config().get("data_format", "json"))
 
 DATA_FILE = Path("tasks.json")
 
+TENANT = None
+STORE = None
 
-def load_tasks():
-    if not DATA_FILE.exists():
-        return []
-    return json.loads(DATA_FILE.read_text(encoding="utf-8"))
 
+def open_tenant(salon=None):
+    # mêmes fichiers, même backend et mêmes backups que le serveur
+    global TENANT, STORE
+    cfg = load_config()
+    directory = Path(cfg.get("tenants_dir", "salons")) / salon if salon else DATA_FILE.parent
+    if salon and not directory.is_dir():
+        raise SystemExit(f"❌ salon {salon} introuvable")
+    TENANT = Tenant(salon or "", directory, cfg)
+    STORE = TENANT.tasks
+    return TENANT
 
-def save_tasks(tasks):
-    DATA_FILE.write_text(
-        json.dumps(tasks, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
 
+def close_tenant():
+    # pas de compaction forcée : le store compacte seul tous les
+    # journal_compact_every ; on attend seulement le backup en attente
+    if TENANT is not None:
+        TENANT.backup_worker.stop()
 
-def list_tasks(tasks):
-    if not tasks:
-        print("Aucune tâche.")
-        return
 
-    ordered = sorted(tasks, key=lambda t: (t.get("done", False), t.get("title", "")))
-    for i, t in enumerate(ordered, start=1):
-        mark = "✅" if t.get("done") else "⬜️"
-        print(f"{i}. {mark} {t.get('title','')}")
-        
+def load_tasks():
+    # relit aussi le journal de l'application web
+    return STORE.load()
 
 
-def ask_index(tasks, prompt):
-    if not tasks:
+def save_tasks(tasks):
+    STORE.save(tasks)
+
+
+def task_json(t):
+    return {"id": t["id"], "title": t.get("title", ""), "done": bool(t.get("done")), "pos": t.get("pos")}
+
+
+# --- commandes non interactives ---
+
+COMMANDS = ("add", "toggle", "delete", "edit", "move")
+
+
+def parse_command(line):
+    # "add <titre>", "toggle <id> [done|todo]", "delete <id>", "edit <id> <titre>",
+    # "move <id> <pos>" ou une ligne JSON {"op": ...} comme POST /batch
+    line = line.strip()
+    if line.startswith("{"):
+        try:
+            op = json.loads(line)
+        except ValueError:
+            raise ValueError("JSON invalide") from None
+        if not isinstance(op, dict):
+            raise ValueError("objet JSON attendu")
+        return op
+    name, _, rest = line.partition(" ")
+    name, rest = name.lower(), rest.strip()
+    if name == "add":
+        return {"op": "add", "title": rest}
+    if name not in COMMANDS:
+        raise ValueError(f"commande inconnue : {name}")
+    raw_id, _, rest = rest.partition(" ")
+    if not raw_id.isdigit():
+        raise ValueError("numéro de tâche attendu")
+    op = {"op": name, "id": int(raw_id)}
+    rest = rest.strip()
+    if name == "toggle" and rest:
+        if rest not in ("done", "todo"):
+            raise ValueError("toggle <id> [done|todo]")
+        op["done"] = rest == "done"
+    elif name == "edit":
+        op["title"] = rest
+    elif name == "move":
+        try:
+            op["pos"] = int(rest)
+        except ValueError:
+            raise ValueError("move <id> <pos>") from None
+    return op
+
+
+def run_ops(ops):
+    # validation sur un seul état (build_batch, comme POST /batch) puis une
+    # seule écriture pour toutes les opérations, sous le même verrou.
+    # Renvoie le rapport.
+    def build(store):
+        others = [op for op in ops if op.get("op") != "add"]
+        other_ops, other_results = build_batch(store, others)
+        other_results = iter(other_results)
+        other_ops = iter(other_ops or [])
+
+        store_ops, results = [], []
+        pos = store.max_pos()
+        for k, op in enumerate(ops):
+            if op.get("op") == "add":
+                title = op.get("title") if "title" in op else (op.get("task") or {}).get("title")
+                ok = isinstance(title, str) and bool(title.strip())
+                results.append({"index": k, "ok": ok, "error": None if ok else "titre vide"})
+                if ok:
+                    pos += POS_GAP
+                    store_ops.append({"op": "add", "task": {"title": title.strip(), "done": op.get("done") is True, "pos": pos}})
+            else:
+                result = dict(next(other_results), index=k)
+                results.append(result)
+                if result["ok"]:
+                    store_ops.append(next(other_ops, None))
+        return (store_ops if all(r["ok"] for r in results) else None), results
+
+    store_ops, results, added = STORE.apply_batch(build)
+    return {"applied": store_ops is not None, "added": added, "results": results}
+
+
+def stats():
+    # compteurs tenus à jour par le store : pas de parcours de la liste
+    total, done = STORE.counts()
+    return {"total": total, "done": done, "todo": total - done}
+
+
+def print_report(report, ops, as_json):
+    if as_json:
+        print(json.dumps(report, ensure_ascii=False))
+        return
+    for r in report["results"]:
+        if not r["ok"]:
+            print(f"❌ opération {r['index'] + 1} ({ops[r['index']].get('op')}) : {r['error']}")
+    if report["applied"]:
+        print(f"✅ {len(ops)} opération(s) appliquée(s).")
+        for task_id in report["added"]:
+            print(f"   ajoutée : {task_id}")
+    else:
+        print("Rien n'a été appliqué.")
+
+
+def print_list(items, as_json):
+    if as_json:
+        print(json.dumps([task_json(t) for _, t in items], ensure_ascii=False))
+        return
+    empty = True
+    for task_id, t in items:
+        empty = False
+        mark = "✅" if t.get("done") else "⬜️"
+        print(f"{task_id}. {mark} {t.get('title','')}")
+    if empty:
         print("Aucune tâche.")
-        return None
+
+
+def run(args):
+    if args.command == "list":
+        done = None if args.done is None else args.done == "1"
+        print_list(STORE.iter_items(q=(args.q or "").strip().lower() or None, done=done), args.json)
+        return 0
+
+    if args.command == "stats":
+        s = stats()
+        if args.json:
+            print(json.dumps(s))
+        else:
+            print(f"Total: {s['total']}")
+            print(f"Faites: {s['done']}")
+            print(f"À faire: {s['todo']}")
+        return 0
+
+    if args.command == "import":
+        import_file(args.file)
+        return 0
+
+    if args.command == "batch":
+        ops, errors = [], []
+        for line_num, line in enumerate(sys.stdin, start=1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            try:
+                ops.append(parse_command(line))
+            except ValueError as e:
+                errors.append({"line": line_num, "error": str(e)})
+        if errors:
+            if args.json:
+                print(json.dumps({"applied": False, "errors": errors}, ensure_ascii=False))
+            else:
+                for e in errors:
+                    print(f"❌ ligne {e['line']} : {e['error']}")
+                print("Rien n'a été appliqué.")
+            return 1
+    elif args.command == "add":
+        ops = [{"op": "add", "title": title} for title in args.titles]
+    elif args.command == "edit":
+        ops = [{"op": "edit", "id": args.id, "title": " ".join(args.title)}]
+    elif args.command == "toggle":
+        extra = {} if args.state is None else {"done": args.state == "done"}
+        ops = [dict({"op": "toggle", "id": task_id}, **extra) for task_id in args.ids]
+    else:
+        ops = [{"op": "delete", "id": task_id} for task_id in args.ids]
+
+    report = run_ops(ops)
+    print_report(report, ops, args.json)
+    return 0 if report["applied"] else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Liste de tâches (sans argument : menu interactif)")
+    parser.add_argument("--json", action="store_true", help="sortie JSON")
+    parser.add_argument("--salon", help="salon de tenants_dir (mode multi-salons)")
+    sub = parser.add_subparsers(dest="command")
+    p = sub.add_parser("add", help="ajoute une ou plusieurs tâches")
+    p.add_argument("titles", nargs="+")
+    p = sub.add_parser("toggle", help="coche / décoche")
+    p.add_argument("ids", nargs="+", type=int)
+    p.add_argument("--state", choices=("done", "todo"), help="état voulu (défaut : inverse)")
+    p = sub.add_parser("delete", help="supprime")
+    p.add_argument("ids", nargs="+", type=int)
+    p = sub.add_parser("edit", help="change le titre")
+    p.add_argument("id", type=int)
+    p.add_argument("title", nargs="+")
+    p = sub.add_parser("list", help="liste dans l'ordre du tableau de bord")
+    p.add_argument("-q", help="recherche dans les titres")
+    p.add_argument("--done", choices=("0", "1"))
+    sub.add_parser("stats", help="totaux")
+    sub.add_parser("batch", help="lit les commandes sur l'entrée standard")
+    p = sub.add_parser("import", help="import CSV / NDJSON")
+    p.add_argument("file")
+    return parser
+
+
+# --- menu interactif ---
+
+def list_tasks():
+    # ordre du tableau de bord (done, pos) ; le numéro affiché est l'id
+    print_list(STORE.ordered(), False)
+
+
+def ask_id(prompt):
     raw = input(prompt).strip()
     if not raw.isdigit():
         print("❌ Entrez un numéro.")
         return None
-    idx = int(raw) - 1
-    if idx < 0 or idx >= len(tasks):
+    task_id = int(raw)
+    if STORE.get(task_id) is None:
         print("❌ Numéro invalide.")
         return None
-    return idx
+    return task_id
 
 
-def add_task(tasks):
+def add_task():
     title = input("Nouvelle tâche : ").strip()
     if not title:
         print("❌ Tâche vide, annulé.")
         return
-    tasks.append({"title": title, "done": False})
-    save_tasks(tasks)
+    STORE.apply_batch(lambda store: (append_ops(store, [{"title": title, "done": False}]), None))
     print("✅ Ajoutée.")
 
 
-def toggle_done(tasks):
-    items = ordered_items(tasks)
-    if not items:
+def toggle_done():
+    if not STORE.counts()[0]:
         print("Aucune tâche.")
         return
 
-    list_tasks(tasks)
-    raw = input("Numéro de la tâche à (dé)cocher : ").strip()
-    if not raw.isdigit():
-        print("❌ Entrez un numéro.")
-        return
-
-    display_idx = int(raw) - 1
-    if display_idx < 0 or display_idx >= len(items):
-        print("❌ Numéro invalide.")
+    list_tasks()
+    task_id = ask_id("Numéro de la tâche à (dé)cocher : ")
+    if task_id is None:
         return
 
-    real_i, _ = items[display_idx]
-    tasks[real_i]["done"] = not bool(tasks[real_i].get("done"))
-    save_tasks(tasks)
+    STORE.apply_batch(lambda store: (toggle_ops(store, task_id), None))
     print("✅ Mise à jour.")
 
 
-def delete_task(tasks):
-    items = ordered_items(tasks)
-    if not items:
+def delete_task():
+    if not STORE.counts()[0]:
         print("Aucune tâche.")
         return
 
-    list_tasks(tasks)
-    raw = input("Numéro de la tâche à supprimer : ").strip()
-    if not raw.isdigit():
-        print("❌ Entrez un numéro.")
-        return
-
-    display_idx = int(raw) - 1
-    if display_idx < 0 or display_idx >= len(items):
-        print("❌ Numéro invalide.")
+    list_tasks()
+    task_id = ask_id("Numéro de la tâche à supprimer : ")
+    if task_id is None:
         return
 
-    real_i, t = items[display_idx]   # <-- LE "MAPPING" est ici
-    removed = tasks.pop(real_i)
-    save_tasks(tasks)
+    removed = STORE.get(task_id)
+    STORE.apply([{"op": "delete", "id": task_id}])
     print(f"🗑️ Supprimée : {removed.get('title','')}")
 
 
-def reset_all(tasks):
-    for t in tasks:
-        t["done"] = False
-    save_tasks(tasks)
+def reset_all():
+    STORE.apply([{"op": "toggle", "id": task_id, "done": False} for task_id, _ in STORE.iter_items(done=True)])
     print("🔄 Tout est repassé à ⬜️.")
 
 
-def show_stats(task):
-    total = len(task)
-    done = sum(1 for t in task if t.get("done"))
-    todo = total - done 
-    print(f"Total: {total}")
-    print(f"Faites: {done}")
-    print(f"Á faire: {todo}")
+def show_stats():
+    s = stats()
+    print(f"Total: {s['total']}")
+    print(f"Faites: {s['done']}")
+    print(f"À faire: {s['todo']}")
 
 
-def edit_task(tasks):
-    items = ordered_items(tasks)
-    if not items:
+def edit_task():
+    if not STORE.counts()[0]:
         print("Aucune tâche.")
         return
 
-    list_tasks(tasks)
-    raw = input("Numéro de la tâche à éditer : ").strip()
-    if not raw.isdigit():
-        print("❌ Entrez un numéro.")
+    list_tasks()
+    task_id = ask_id("Numéro de la tâche à éditer : ")
+    if task_id is None:
         return
 
-    display_idx = int(raw) - 1
-    if display_idx < 0 or display_idx >= len(items):
-        print("❌ Numéro invalide.")
-        return
-
-    real_i, _ = items[display_idx]   # <-- MAPPING affichage -> vrai index
-
     new_title = input("Nouveau titre : ").strip()
     if not new_title:
         print("❌ Titre vide, annulé.")
         return
 
-    tasks[real_i]["title"] = new_title
-    save_tasks(tasks)
+    STORE.apply([{"op": "edit", "id": task_id, "title": new_title}])
     print("✅ Tâche modifiée.")
-    
-def main():
-    tasks = load_tasks()
 
+def main():
+    # le store relit lui-même les écritures des autres processus : pas de
+    # rechargement après chaque commande
     while True:
         print("\n--- TASKS v1 ---")
         print("A) Ajouter")
@@ -161,48 +351,43 @@ def main():
         choice = input("> ").strip().lower()
 
         if choice in ("a", "1"):
-            add_task(tasks)
-            tasks = load_tasks()
+            add_task()
         elif choice in ("l", "2"):
-            list_tasks(tasks)
+            list_tasks()
         elif choice in ("c", "3"):
-            toggle_done(tasks)
-            tasks = load_tasks()
+            toggle_done()
         elif choice in ("d",):
-            delete_task(tasks)
-            tasks = load_tasks()
+            delete_task()
         elif choice in ("r",):
-            reset_all(tasks)
-            tasks = load_tasks()
+            reset_all()
         elif choice in ("s",):
-            show_stats(tasks)
-            tasks = load_tasks()
-        elif choice in ("e,"):
-            edit_task(tasks)
-            tasks = load_tasks()
+            show_stats()
+        elif choice in ("e",):
+            edit_task()
         elif choice in ("q", "4"):
             print("Bye.")
             break
         else:
             print("❌ Choix invalide.")
-def ordered_items(tasks):
-    # retourne une liste de tuples: (index_original, task)
-    return sorted(
-        list(enumerate(tasks)),
-        key=lambda it: (it[1].get("done", False), it[1].get("title", "")),
-    )
-
-def list_tasks(tasks):
-    items = ordered_items(tasks)
-    if not items:
-        print("Aucune tâche.")
-        return
-    for display_i, (real_i, t) in enumerate(items, start=1):
-        mark = "✅" if t.get("done") else "⬜️"
-        print(f"{display_i}. {mark} {t.get('title','')}")
+
+
+def import_file(path):
+    # python tasks.py import fichier.csv (ou .ndjson)
+    with open(path, "rb") as f:
+        new_tasks, report = read_import(f, detect_format(path))
+    if new_tasks:
+        STORE.import_tasks(new_tasks)
+    print(f"✅ {report['imported']} tâche(s) importée(s).")
+    for e in report["errors"]:
+        print(f"❌ ligne {e['line']} : {e['error']}")
+    if report["error_count"] > len(report["errors"]):
+        print(f"… {report['error_count'] - len(report['errors'])} autre(s) erreur(s).")
 
 
 if __name__ == "__main__":
-    main()
-      
-      
+    args = build_parser().parse_args()
+    open_tenant(args.salon)
+    try:
+        sys.exit(run(args) if args.command else main())
+    finally:
+        close_tenant()
@@ -0,0 +1,258 @@
+import re
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from backups import BackupStore, BackupWorker
+from config import load_config
+from kpi import KpiLog
+from plan import PlanStore
+from render import RenderCache
+from storage import FileLock, file_signature, read_bytes, decode, write_data
+from store import open_store
+
+# Plusieurs salons servis par un seul processus : chaque salon a son dossier
+# (salons/<nom>/tasks.json, plan.json, salon.json, suivi.json, kpi.log, backups/) et
+# ses stores. Les salons ouverts sont gardés dans un LRU borné par un budget
+# mémoire (estimation) ; le moins récemment utilisé est fermé au-delà.
+# contenu.json (modèle commun, en lecture seule) est chargé une fois pour tous.
+#   python tenants.py list
+#   python tenants.py create <nom>
+
+TENANT_MODES = ("", "prefix", "subdomain")
+
+NAME_RE = re.compile(r"^[a-z0-9][a-z0-9-]{0,62}$")
+
+# octets en mémoire par octet de fichier chargé (dicts / colonnes Python vs JSON)
+PARSED_FACTOR = 4
+
+# estimation d'une page HTML ou JSON gardée dans le cache des pages
+PAGE_BYTES = 64 * 1024
+
+EMPTY_SUIVI = {"week": 1, "data": {"leads": 0, "bookings": 0, "noshow": 0, "revenue": 0, "reviews": 0}}
+
+
+class SharedFile:
+    # document en lecture seule commun à tous les salons : décodé une seule
+    # fois, relu seulement si le fichier change ; None si absent.
+    # Ne pas modifier l'objet renvoyé (partagé entre salons et requêtes).
+    def __init__(self, path):
+        self.path = Path(path)
+        self.loads = 0
+        self._data = None
+        self._sig = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            sig = file_signature(self.path)
+            if sig != self._sig:
+                raw = read_bytes(self.path)
+                self._data = decode(raw) if raw is not None else None
+                self._sig = sig
+                self.loads += 1
+            return self._data
+
+
+class Tenant:
+    def __init__(self, name, directory, cfg):
+        self.name = name
+        self.dir = Path(directory)
+        self.active = 0  # requêtes en cours : jamais fermé par le LRU pendant ce temps
+        self.data_file = self.dir / "tasks.json"
+        self.plan_file = self.dir / "plan.json"
+        self.salon_file = self.dir / "salon.json"
+        self.suivi_file = self.dir / "suivi.json"
+        # historique des indicateurs de /suivi (kpi.log + cumuls kpi.rollup.json)
+        self.kpi = KpiLog(self.dir / "kpi.log")
+        self.backups = BackupStore(self.dir / "backups", keep=int(cfg.get("keep_backups", 30)))
+        # les sauvegardes partent en arrière-plan ; les compactions rapprochées
+        # (fenêtre backup_delay) ne donnent qu'un seul snapshot
+        self.backup_worker = BackupWorker(self.backups, self.read_tasks_file, delay=float(cfg.get("backup_delay", 2)))
+        # backend JSON (journal) ou SQLite selon config.json ; tasks.json n'est
+        # réécrit (et sauvegardé dans backups/) qu'au moment de la compaction
+        self.tasks = open_store(self.data_file, cfg, on_snapshot=self.backup_worker.submit)
+        # programme gardé en mémoire (index des actions + compteurs), relu si plan.json change
+        self.plan = PlanStore(self.plan_file)
+        # programme / contenu déjà remplis, recalculés seulement si salon.json
+        # ou le fichier source change
+        self.renders = RenderCache()
+        # pages en lecture seule gardées par ETag (voir conditional dans app.py)
+        self.pages = RenderCache(size=32)
+
+    def read_tasks_file(self):
+        return read_bytes(self.data_file)
+
+    def memory(self):
+        # estimation en octets pour le budget du LRU
+        def size(path):
+            sig = file_signature(path)
+            return sig[1] if sig else 0
+
+        plan = size(self.plan_file)
+        loaded = size(self.data_file) + plan + size(self.salon_file) + size(self.kpi.rollup_path)
+        rendered = plan * self.renders.stats()["size"]
+        return PARSED_FACTOR * (loaded + rendered) + PAGE_BYTES * self.pages.stats()["size"]
+
+    def close(self):
+        # le journal est déjà sur disque : on compacte et on termine les backups en attente
+        self.backup_worker.stop()
+        self.tasks.compact()
+        self.backup_worker.flush()
+
+
+class Tenants:
+    # LRU des salons ouverts ; `budget` en octets (estimation, voir Tenant.memory)
+    def __init__(self, root, cfg, budget):
+        self.root = Path(root)
+        self.cfg = cfg
+        self.budget = budget
+        self.opened = 0
+        self.evicted = 0
+        self._open = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def exists(self, name):
+        return bool(NAME_RE.match(name or "")) and (self.root / name).is_dir()
+
+    def acquire(self, name):
+        # salon ouvert (ou ouvert maintenant) et marqué en cours d'utilisation ;
+        # None s'il n'existe pas (pas de création implicite)
+        with self._lock:
+            tenant = self._open.get(name)
+            if tenant is not None:
+                self._open.move_to_end(name)
+                tenant.active += 1
+                return tenant
+        if not self.exists(name):
+            return None
+        with self._lock:
+            tenant = self._open.get(name)
+            if tenant is None:
+                tenant = self._open[name] = Tenant(name, self.root / name, self.cfg)
+                self.opened += 1
+            self._open.move_to_end(name)
+            tenant.active += 1
+        return tenant
+
+    def release(self, tenant):
+        # fin de requête : remet à jour l'estimation du salon puis ferme les
+        # moins récemment utilisés (hors salons en cours d'utilisation) tant
+        # que le budget est dépassé
+        size = tenant.memory()
+        closing = []
+        with self._lock:
+            tenant.active -= 1
+            if self._open.get(tenant.name) is tenant:
+                self._sizes[tenant.name] = size
+            total = sum(self._sizes.get(n, 0) for n in self._open)
+            for name, old in list(self._open.items()):
+                if total <= self.budget:
+                    break
+                if old.active or old is tenant:
+                    continue
+                del self._open[name]
+                total -= self._sizes.pop(name, 0)
+                self.evicted += 1
+                closing.append(old)
+        for old in closing:
+            old.close()
+
+    def open_tenants(self):
+        with self._lock:
+            return list(self._open.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "memory": sum(self._sizes.get(n, 0) for n in self._open),
+                "budget": self.budget,
+                "opened": self.opened,
+                "evicted": self.evicted,
+            }
+
+    def close_all(self):
+        with self._lock:
+            tenants = list(self._open.values())
+            self._open.clear()
+            self._sizes.clear()
+        for tenant in tenants:
+            tenant.close()
+
+    def create(self, name, plan_template=None):
+        # nouveau salon : dossier + programme vierge copié du modèle
+        if not NAME_RE.match(name or ""):
+            raise ValueError("nom de salon invalide (minuscules, chiffres et tirets)")
+        directory = self.root / name
+        with FileLock(directory):  # salons/<nom>.lock : deux créations simultanées
+            if directory.exists():
+                raise ValueError(f"le salon {name} existe déjà")
+            directory.mkdir(parents=True)
+            plan = {"sector": "coiffeur", "week": 1, "days": []}
+            raw = read_bytes(plan_template) if plan_template else None
+            if raw is not None:
+                plan = decode(raw)
+                for d in plan.get("days", []):
+                    for it in d.get("items", []):
+                        it["done"] = False
+            write_data(directory / "plan.json", plan)
+            write_data(directory / "suivi.json", EMPTY_SUIVI)
+        return directory
+
+
+class TenantRouter:
+    # middleware WSGI : repère le salon de la requête et le note dans
+    # environ["taches.tenant"]
+    #   prefix    : /t/<nom>/... ; le préfixe passe dans SCRIPT_NAME, donc les
+    #               routes restent les mêmes et url_for() génère des liens préfixés
+    #   subdomain : <nom>.exemple.fr (ou <nom>.localhost)
+    def __init__(self, app, mode):
+        self.app = app
+        self.mode = mode
+
+    def __call__(self, environ, start_response):
+        name = None
+        if self.mode == "prefix":
+            parts = environ.get("PATH_INFO", "").split("/", 3)
+            if len(parts) >= 3 and parts[1] == "t" and NAME_RE.match(parts[2]):
+                name = parts[2]
+                environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + "/t/" + name
+                environ["PATH_INFO"] = "/" + (parts[3] if len(parts) > 3 else "")
+        elif self.mode == "subdomain":
+            host = (environ.get("HTTP_HOST") or environ.get("SERVER_NAME", "")).split(":")[0].lower()
+            labels = host.split(".")
+            if (len(labels) > 2 or labels[-1] == "localhost" and len(labels) == 2) and NAME_RE.match(labels[0]):
+                name = labels[0]
+        environ["taches.tenant"] = name
+        return self.app(environ, start_response)
+
+
+def open_tenants(cfg):
+    return Tenants(cfg.get("tenants_dir", "salons"), cfg, int(cfg.get("tenant_memory_mb", 256)) * 1024 * 1024)
+
+
+def main(argv):
+    tenants = open_tenants(load_config())
+    if len(argv) == 2 and argv[0] == "create":
+        try:
+            directory = tenants.create(argv[1], plan_template=Path("plan.json"))
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"✅ salon créé : {directory}")
+        return 0
+    if argv == ["list"]:
+        names = sorted(p.name for p in tenants.root.iterdir() if tenants.exists(p.name)) if tenants.root.is_dir() else []
+        for name in names:
+            print(name)
+        if not names:
+            print("Aucun salon.")
+        return 0
+    print("usage : python tenants.py list | create <nom>")
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
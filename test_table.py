@@ -0,0 +1,66 @@
+import random
+from store import TaskStore
+from table import TaskTable
+
+# Régression : relecture de lignes dans un ordre d'ids quelconque (les
+# suppressions déplacent la dernière ligne dans la case libérée)
+
+
+def test_reload_after_deletes_and_compaction(tmp_path):
+    store = TaskStore(tmp_path / "tasks.json")
+    store.import_tasks([{"title": f"t{i}", "done": False, "pos": i} for i in range(3000)])
+    ids = [key for key, _ in store.ordered()]
+    for key in random.Random(0).sample(ids, 2850):
+        store.apply([{"op": "delete", "id": key}])
+    store.compact(force=True)
+
+    kept = sorted(key for key, _ in store.ordered())
+    reopened = TaskStore(tmp_path / "tasks.json")
+    assert all(reopened.get(key) is not None for key in kept)
+    assert sorted(key for key, _ in reopened.ordered()) == kept
+    assert reopened.page(50)["total"] == len(kept)
+
+
+def test_unsorted_sparse_ids():
+    ids = [*range(1, 11), 3000, 1030, 2000, 3100]
+    table = TaskTable([{"id": i, "title": str(i)} for i in [*ids, 1]])  # id en double : ajout ligne par ligne
+    assert sorted(table.order()) == sorted(ids)
+    assert sorted(t["id"] for t in table.dicts()) == sorted(ids)
+    for key in ids:
+        assert table.to_dict(key)["id"] == key
+
+
+def test_save_with_unsorted_ids(tmp_path):
+    store = TaskStore(tmp_path / "tasks.json")
+    ids = [*range(1, 11), 3000, 1030, 2000, 3100]
+    store.save([{"id": i, "title": str(i)} for i in ids])
+    assert sorted(t["id"] for t in store.load()) == sorted(ids)
+
+
+def test_delete_sparse_id():
+    table = TaskTable([{"id": i, "title": str(i)} for i in (1, 2000, 1000)])
+    table.delete(2000)  # la ligne de 1000 prend la place de celle de 2000
+    assert 2000 not in table and table.get(2000) is None
+    assert table.to_dict(1000)["title"] == "1000"
+    assert table.to_dict(1)["title"] == "1"
+    table.delete(1000)
+    assert 1000 not in table and sorted(table.order()) == [1]
+
+
+def test_random_adds_and_deletes():
+    rng = random.Random(1)
+    table, model = TaskTable(), {}
+    for _ in range(5000):
+        key = rng.choice([rng.randrange(50), rng.randrange(5000), rng.randrange(10**6)])
+        if key in model and rng.random() < 0.6:
+            table.delete(key)
+            del model[key]
+        else:
+            model[key] = {"id": key, "title": f"t{key}", "done": False, "pos": key}
+            table.add(model[key])
+        assert (key in table) == (key in model)
+    assert sorted(table.ids) == sorted(model)
+    for key, t in model.items():
+        assert table.to_dict(key) == t
+    for key in rng.sample(range(10**6), 2000):
+        assert (key in table) == (key in model)